@@ -0,0 +1,36 @@
+"""Benchmark for indexing heading anchors and checking internal links against them, which
+should stay linear in the size of the document even with many duplicate headings
+
+Usage: python benchmarks/anchors.py [headings?]"""
+
+import sys
+import timeit
+import warnings
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+for size in (count // 4, count // 2, count):
+    # Headings repeating a few titles, each linked back to from a paragraph
+    lines = ["# Contents"]
+    for i in range(size):
+        lines.append(f"## Step {i % 10}")
+        lines.append(
+            f"Back to [step](#step-{i % 10}-{i // 10}) or [nowhere](#gone-{i % 5})"
+        )
+    md = "\n\n".join(lines)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        parse = min(
+            timeit.repeat(lambda: Document(md, Path("anchors.md")), number=1, repeat=3)
+        )
+        doc = Document(md, Path("anchors.md"))
+    save = min(timeit.repeat(lambda: doc.save(BytesIO(), True), number=1, repeat=3))
+    print(
+        f"{size:>6} headings  parse {parse / size * 1e6:6.2f} us/heading"
+        f"  stream {save / size * 1e6:6.2f} us/heading  {len(doc.anchors)} anchors"
+    )
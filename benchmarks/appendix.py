@@ -0,0 +1,44 @@
+"""Benchmark for documents linking to many local files over and over, which are read once
+each across a thread pool while parsing carries on and shown in an appendix
+
+Usage: python benchmarks/appendix.py [files?] [links?]"""
+
+import sys
+import tempfile
+import timeit
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Appendix, Document
+
+files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+with tempfile.TemporaryDirectory() as tmp:
+    # Config files and logs, some of which are bigger than the appendix shows
+    for i in range(files):
+        size = 200 if i % 2 == 0 else 4000
+        lines = (f"{i}.{j} some logged event happened here" for j in range(size))
+        (Path(tmp) / f"file{i}.log").write_text("\n".join(lines))
+    paras = [
+        f"See [log {i}](file{i % files}.log) and [again](file{(i * 7) % files}.log)."
+        for i in range(count // 2)
+    ]
+    md = "\n\n".join(["# Spec", *paras])
+    path = Path(tmp) / "spec.md"
+
+    # Time reading each file once on its own, for comparison
+    def serial():
+        for i in range(files):
+            (Path(tmp) / f"file{i}.log").read_bytes()[: Appendix.MAX_BYTES]
+
+    took_read = min(timeit.repeat(serial, number=1, repeat=3))
+    took_parse = min(timeit.repeat(lambda: Document(md, path), number=1, repeat=3))
+    doc = Document(md, path)
+    took_save = min(
+        timeit.repeat(lambda: doc.save(BytesIO(), True), number=1, repeat=3)
+    )
+    print(
+        f"{count} links to {len(doc.ctx.appendix.files)} files  parse {took_parse:6.3f}s"
+        f"  stream {took_save:6.3f}s  (reading each file once takes {took_read:6.3f}s)"
+    )
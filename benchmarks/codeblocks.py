@@ -0,0 +1,42 @@
+"""Benchmark for rendering long codeblocks per line or compactly as one paragraph, giving
+the size of `word/document.xml` and time taken for each
+
+Usage: python benchmarks/codeblocks.py [lines?]"""
+
+import sys
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Codeblock, Document
+
+
+def render(md: str, compact: bool, streaming: bool) -> tuple:
+    """Saves markdown, getting the seconds it took and the size of its document xml"""
+    Codeblock.COMPACT_LINES = 0 if compact else sys.maxsize
+    doc = Document(md, Path("codeblocks.md"))
+    buf = BytesIO()
+    start = time.perf_counter()
+    doc.save(buf, streaming)
+    took = time.perf_counter() - start
+    with zipfile.ZipFile(buf) as zf:
+        return (took, zf.getinfo("word/document.xml").file_size)
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+for lines in (100, count // 10, count):
+    code = "\n".join(
+        f"    result_{i} = some_function(argument_{i})" for i in range(lines)
+    )
+    md = f"# Listing\n\n```python\n{code}\n```\n"
+    for streaming in (False, True):
+        per_line = render(md, False, streaming)
+        compact = render(md, True, streaming)
+        print(
+            f"{lines:>7} lines {'stream' if streaming else 'docx':<6}"
+            f"  per line {per_line[1] / 1024:8.1f} KiB {per_line[0]:6.3f}s"
+            f"  compact {compact[1] / 1024:8.1f} KiB {compact[0]:6.3f}s"
+            f"  ({(1 - compact[1] / per_line[1]) * 100:.0f}% smaller)"
+        )
@@ -0,0 +1,62 @@
+"""Benchmark for saving large highlighted codeblocks against unhighlighted ones, with and
+without highlighting already memoised, and how many runs merging tokens saves
+
+Usage: python benchmarks/highlight.py [lines?]"""
+
+import sys
+import timeit
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import mdcx
+from mdcx import Document, Style
+
+CODE = [
+    "def handle(request, *args, **kwargs):",
+    '    """Handles a request, returning the response"""',
+    "    response = process(request.body, timeout=30)  # may raise",
+    '    if response.status != 200 and not kwargs.get("quiet"):',
+    '        raise Exception(f"Failed with {response.status}")',
+    "    return [item for item in response.items if item.ok]",
+    "",
+]
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+code = "\n".join(CODE * (count // len(CODE)))
+md = f"# Listing\n\n```python\n{code}\n```\n"
+plain = Style.andy()
+highlighted = Style.andy()
+highlighted.code_theme = "default"
+
+# Get tokens against runs after merging
+from pygments.lexers import get_lexer_by_name
+
+tokens = sum(1 for token in get_lexer_by_name("python").get_tokens(code) if token[1])
+runs = sum(len(line) for line in mdcx._highlight(code.split("\n"), "python", "default"))
+print(f"{count} lines  {tokens} tokens merged into {runs} runs")
+
+
+def save(style: Style, memoised: bool, streaming: bool):
+    if not memoised:
+        mdcx._highlighted.clear()
+    Document(md, Path("highlight.md"), style).save(BytesIO(), streaming)
+
+
+for streaming in (True, False):
+    cases = {
+        "plain": (plain, True),
+        "highlighted": (highlighted, False),
+        "memoised": (highlighted, True),
+    }
+    took = {
+        name: min(timeit.repeat(lambda: save(*case, streaming), number=1, repeat=3))
+        for name, case in cases.items()
+    }
+    print(
+        f"{'stream' if streaming else 'docx':<6}"
+        + "".join(
+            f"  {name} {secs:6.3f}s ({secs / took['plain']:.1f}x)"
+            for name, secs in took.items()
+        )
+    )
@@ -0,0 +1,22 @@
+"""Micro-benchmark for inline paragraph parsing on very long lines"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Context, Paragraph
+
+LINES = {
+    "plain": "lorem ipsum dolor sit amet " * 400,
+    "emphasis": "some *italic* and **bold** words " * 350,
+    "links": "see [the docs](https://example.com/docs) and <https://example.com> "
+    * 160,
+    "unclosed": "[ < " * 3000,
+}
+
+for name, line in LINES.items():
+    secs = min(
+        timeit.repeat(lambda: Paragraph._md(Context(), line), number=5, repeat=3)
+    )
+    print(f"{name:<10} {len(line):>7} chars  {secs / 5 * 1000:8.2f} ms/line")
@@ -0,0 +1,39 @@
+"""Benchmark for saving link-dense documents citing the same urls over and over, giving
+links saved per second and how many relationships they needed
+
+Usage: python benchmarks/links.py [links?] [unique?]"""
+
+import re
+import sys
+import timeit
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+unique = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+lines = []
+for i in range(0, count, 10):
+    links = [
+        f"[cite {j}](https://example.com/ref/{j % unique})" for j in range(i, i + 8)
+    ]
+    links.append(f"<https://example.org/{i % unique}>")
+    links.append(f"[back](#section-{i % 50})")
+    lines.append("See " + ", ".join(links) + ".")
+lines.extend(f"## Section {i}" for i in range(50))
+md = "\n\n".join(lines)
+
+doc = Document(md, Path("links.md"))
+for streaming in (False, True):
+    buf = BytesIO()
+    took = min(timeit.repeat(lambda: doc.save(buf, streaming), number=1, repeat=3))
+    with zipfile.ZipFile(buf) as zf:
+        rels = zf.read("word/_rels/document.xml.rels").decode()
+    hyperlinks = len(re.findall(r'Type="[^"]*/hyperlink"', rels))
+    print(
+        f"{'stream' if streaming else 'docx':<6} {count} links  {took:6.3f}s"
+        f"  {count / took:9.0f} links/s  {hyperlinks} hyperlink relationships"
+    )
@@ -0,0 +1,28 @@
+"""Benchmark for memory held by parsed documents
+
+Usage: python benchmarks/memory.py [paragraphs?]"""
+
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+PARAGRAPHS = {
+    "plain": "Just a plain paragraph of text without any formatting in it at all.",
+    "formatted": "Some *italic*, **bold** and a [link](https://example.com) in here.",
+    "bullets": "- A bullet point with *some* formatting",
+}
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+for name, para in PARAGRAPHS.items():
+    md = "\n\n".join([para] * count)
+    tracemalloc.start()
+    doc = Document(md, Path("memory.md"))
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<10} {held / 1024 / 1024:6.2f} MB per {count} ({held / count:.0f} B each)"
+    )
+    del doc
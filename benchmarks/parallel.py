@@ -0,0 +1,36 @@
+"""Benchmark for parsing one huge document in chunks across processes, against parsing it
+serially, which is only faster with as many cores as jobs to spare
+
+Usage: python benchmarks/parallel.py [sections?] [jobs?]"""
+
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+most = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+# Sections of mixed blocks with the odd captioned figure, like a generated report
+section = [
+    "Some *italic*, **bold** and `code` words along with plain text and more of it.",
+    "- A bullet point with **bold** in it\n- And another one",
+    "> Quoted from somewhere else",
+    "```python\nresult = some_function(argument, *args, **kwargs)\n```",
+]
+lines = []
+for i in range(count):
+    lines.append(f"## Section {i}")
+    lines.extend(section)
+    if i % 50 == 0:
+        lines.append(f"![Figure {i} of the report](images/airbnb_icon.png)")
+md = "\n\n".join(lines)
+size = md.count("\n") + 1
+path = Path(__file__).parent.parent / "examples" / "report.md"
+
+print(f"{size} lines on {os.cpu_count()} cores")
+for jobs in sorted({1, 2, most}):
+    took = min(timeit.repeat(lambda: Document(md, path, jobs=jobs), number=1, repeat=3))
+    print(f"{jobs:>3} jobs  parse {took:6.3f}s  {took / size * 1e6:6.2f} us/line")
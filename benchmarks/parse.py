@@ -0,0 +1,28 @@
+"""Benchmark for block-level parsing per line, mostly of code-heavy documents
+
+Usage: python benchmarks/parse.py [lines?]"""
+
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document, scan
+
+CODE = "```python\n" + "\n".join(f"    value_{i} = compute({i}) + 1" for i in range(40))
+DOCUMENTS = {
+    "code": "# Listing\n\nSome text about it.\n\n" + CODE + "\n```\n",
+    "prose": "# Section\n\nJust a plain paragraph of text.\n\nAnother one here.\n",
+    "lists": "- A bullet point\n  - Nested bullet\n1. Numbered\n2. Numbered\n> Quote\n",
+}
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+for name, chunk in DOCUMENTS.items():
+    md = chunk * (count // chunk.count("\n"))
+    lines = md.splitlines()
+    scanned = min(timeit.repeat(lambda: sum(1 for _ in scan(lines)), number=1))
+    parsed = min(timeit.repeat(lambda: Document(md, Path("parse.md")), number=1))
+    print(
+        f"{name:<6} {len(lines):>7} lines  scan {scanned / len(lines) * 1e6:6.3f} us/line"
+        f"  parse {parsed / len(lines) * 1e6:6.3f} us/line"
+    )
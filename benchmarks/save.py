@@ -0,0 +1,46 @@
+"""Benchmark for saving through python-docx compared to the streaming writer.
+
+Usage: python benchmarks/save.py [scale?]
+
+Each save runs in its own process so peak RSS can be compared fairly"""
+
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+EXAMPLE = Path(__file__).parent.parent / "examples" / "airbnb.md"
+
+
+def run(scale: int, streaming: bool):
+    md = EXAMPLE.read_text() * scale
+    start = time.perf_counter()
+    doc = Document(md, EXAMPLE)
+    parsed = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        doc.save(Path(tmp) / "out.docx", streaming)
+        saved = time.perf_counter()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{parsed - start:.2f} {saved - parsed:.2f} {rss:.0f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run(int(sys.argv[1]), sys.argv[2] == "streaming")
+        sys.exit(0)
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print(f"airbnb.md x{scale}")
+    for mode in ["docx", "streaming"]:
+        out = subprocess.run(
+            [sys.executable, __file__, str(scale), mode],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        parse, save, rss = out.stdout.split()
+        print(f"{mode:<10} parse {parse}s  save {save}s  peak rss {rss} MB")
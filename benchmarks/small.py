@@ -0,0 +1,27 @@
+"""Benchmark for the fixed cost of saving small documents, as in batch runs
+
+Usage: python benchmarks/small.py [saves?]"""
+
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document, Style
+
+MD = "# Small\n\nA *small* document with a [link](https://example.com).\n"
+
+saves = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+for name, style in [("andy", Style.andy()), ("foxtrot", Style.foxtrot())]:
+    for streaming in [False, True]:
+        times = []
+        for _ in range(saves):
+            start = time.perf_counter()
+            Document(MD, Path("small.md"), style).save(BytesIO(), streaming)
+            times.append(time.perf_counter() - start)
+        warm = sorted(times[1:])[len(times) // 2] if saves > 1 else times[0]
+        mode = "streaming" if streaming else "docx"
+        print(
+            f"{name:<8} {mode:<10} first {times[0] * 1000:6.1f}ms  warm {warm * 1000:6.1f}ms"
+        )
@@ -0,0 +1,49 @@
+"""Benchmark for command-line startup, totalling import time with `-X importtime`
+
+Usage: python benchmarks/startup.py [runs?]
+
+Measures the help path, converting a document without images and one with them, taking
+the fastest run of each and listing the slowest top-level imports"""
+
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+MDCX = ROOT / "mdcx.py"
+IMAGES = ROOT / "examples" / "airbnb.md"
+TEXT = "# Text Only\n\nA document with *no* images in it.\n\n- Just\n- Bullets\n"
+
+
+def imports(args: list[str]) -> tuple:
+    """Runs command-line and gets total top-level import time and the slowest imports"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", str(MDCX), *args],
+        capture_output=True,
+        text=True,
+    )
+    took = {}
+    for line in out.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S.*)$", line)
+        if match:
+            took[match.group(2)] = int(match.group(1)) / 1000
+    slowest = sorted(took.items(), key=lambda item: -item[1])[:3]
+    return (sum(took.values()), slowest)
+
+
+runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+with tempfile.TemporaryDirectory() as tmp:
+    text = Path(tmp) / "text.md"
+    text.write_text(TEXT)
+    cases = {
+        "help": ["--help"],
+        "text": [str(text), str(Path(tmp) / "text.docx")],
+        "images": [str(IMAGES), str(Path(tmp) / "images.docx")],
+    }
+    for name, args in cases.items():
+        results = [imports(args) for _ in range(runs)]
+        total = min(result[0] for result in results)
+        slowest = ", ".join(f"{module} {ms:.1f}ms" for module, ms in results[0][1])
+        print(f"{name:<8} {total:6.1f}ms imports  ({slowest})")
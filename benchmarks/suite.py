@@ -0,0 +1,270 @@
+"""Benchmark suite timing the parse, render and save phases over synthetic documents
+
+Usage: python benchmarks/suite.py run [out.json?] [--scale n] [--repeat n]
+       python benchmarks/suite.py compare [old.json] [new.json] [--threshold percent]
+
+Results are written as json so runs from two revisions can be compared, which exits with
+an error if any phase got slower or used more memory than the threshold allows. Peak
+memory is the peak RSS of converting each case in its own process"""
+
+import json
+import platform
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import mdcx
+from mdcx import Document, Profile, Style
+
+PHASES = ["parse", "render", "save", "stream"]
+NOISE_FLOOR = 0.005  # seconds a phase has to change by to count as a regression
+
+
+def gen_paragraphs(scale: int, wd: Path) -> str:
+    """Long paragraphs of mixed formatting"""
+    para = "Some *italic*, **bold** and ***both*** words along with plain text. " * 20
+    return "\n\n".join(f"# Section {i}\n\n{para}\n\n{para}" for i in range(scale * 5))
+
+
+def gen_nesting(scale: int, wd: Path) -> str:
+    """Bullet and numbered points nested as deep as list styles go, and deep quotes"""
+    lines = []
+    for i in range(scale * 50):
+        for level in range(3):
+            lines.append("  " * level + f"- Bullet at level {level} of *item* {i}")
+        for level in range(3):
+            lines.append("  " * level + f"{level + 1}. Numbered at level {level}")
+        for level in range(8):
+            lines.append("  " * level + f"> Quote at level {level} of item {i}")
+    return "\n".join(lines)
+
+
+def gen_links(scale: int, wd: Path) -> str:
+    """Lines packed with external, internal and cheeky links"""
+    line = " ".join(
+        f"[link {i}](https://example.com/{i}) <https://example.org/{i % 7}> [here](#s{i})"
+        for i in range(10)
+    )
+    return "\n\n".join([line] * scale * 40)
+
+
+def gen_images(scale: int, wd: Path) -> str:
+    """Many images, each distinct file shown a few times with captions"""
+    lines = []
+    for i in range(scale * 10):
+        name = f"image{i}.png"
+        (wd / name).write_bytes(_png(64 + i % 64, 48 + i % 32, i))
+        for copy in range(3):
+            lines.append(f"![Image {i} shown again {copy}]({name})")
+    return "\n\n".join(lines)
+
+
+def gen_code(scale: int, wd: Path) -> str:
+    """Huge codeblocks with long lines"""
+    code = "\n".join(
+        f"    result_{i} = some_function(argument_{i}, *args, **kwargs)  # {i}"
+        for i in range(scale * 1000)
+    )
+    return f"# Code\n\n```python\n{code}\n```\n\nAfterwards."
+
+
+def gen_frontmatter(scale: int, wd: Path) -> str:
+    """Big front matter before a small body"""
+    keys = "\n".join(f"key_{i}: value number {i}" for i in range(scale * 2000))
+    return f"---\ntitle: Front Matter\nsubtitle: Lots of it\n{keys}\n---\n\nBody text."
+
+
+GENERATORS = {
+    "paragraphs": gen_paragraphs,
+    "nesting": gen_nesting,
+    "links": gen_links,
+    "images": gen_images,
+    "code": gen_code,
+    "frontmatter": gen_frontmatter,
+}
+
+
+def _png(width: int, height: int, seed: int) -> bytes:
+    """Generates a small png with a colour gradient without needing an imaging library"""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    rows = b"".join(
+        b"\x00" + bytes((x * 4 + seed) % 256 for x in range(width * 3))
+        for _ in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+
+def run_case(md: str, path: Path, style: Style) -> dict:
+    """Times each phase of converting `md` once"""
+    result = {"elements": {}}
+    # Parse
+    start = time.perf_counter()
+    doc = Document(md, path, style)
+    result["parse"] = time.perf_counter() - start
+
+    # Save through python-docx, splitting rendering each element from zipping it up
+    images = mdcx.ImageCache()
+    with Profile() as profile:
+        doc.save(BytesIO(), False, images)
+    for name, (_, secs, _) in profile.stats.items():
+        if name.startswith("render "):
+            result["elements"][name[len("render ") :]] = secs
+    result["save"] = profile.stats["zip"][1]
+    result["render"] = sum(stat[1] for stat in profile.stats.values()) - result["save"]
+
+    # Stream straight to a docx instead
+    start = time.perf_counter()
+    doc.save(BytesIO(), True, images)
+    result["stream"] = time.perf_counter() - start
+    return result
+
+
+def peak_memory(name: str, scale: int) -> int:
+    """Gets peak RSS in bytes of parsing and saving a case through python-docx, in a
+    fresh process so cases don't share a peak"""
+    out = subprocess.run(
+        [sys.executable, __file__, "_memory", name, str(scale)],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return int(out.stdout)
+
+
+def _memory(name: str, scale: int):
+    """Converts a case and prints the peak RSS of this process in bytes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        md = GENERATORS[name](scale, Path(tmp))
+        Document(md, Path(tmp) / f"{name}.md").save(BytesIO())
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(rss if sys.platform == "darwin" else rss * 1024)
+
+
+def revision() -> str | None:
+    """Gets the git revision being benchmarked, if there is one"""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(out: Path | None, scale: int, repeat: int):
+    """Runs every case, keeping the fastest time of each phase over the repeats"""
+    # Measure memory first, as children can inherit the peak RSS of a grown parent
+    style = Style.andy()
+    peaks = {name: peak_memory(name, scale) for name in GENERATORS}
+
+    # Time each case
+    results = {}
+    for name, generator in GENERATORS.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / f"{name}.md"
+            md = generator(scale, Path(tmp))
+            runs = [run_case(md, path, style) for _ in range(repeat)]
+            result = {phase: min(run[phase] for run in runs) for phase in PHASES}
+            result["elements"] = {
+                element: min(run["elements"][element] for run in runs)
+                for element in runs[0]["elements"]
+            }
+            result["peak_memory"] = peaks[name]
+            result["lines"] = md.count("\n") + 1
+        results[name] = result
+        print(
+            f"{name:<12} "
+            + "  ".join(f"{phase} {result[phase]:7.3f}s" for phase in PHASES)
+            + f"  peak {result['peak_memory'] / 1024 / 1024:7.1f} MB"
+        )
+        for element, secs in sorted(result["elements"].items()):
+            print(f"{'':<12} {element:<14} {secs:7.3f}s")
+
+    # Write results
+    if out is not None:
+        meta = {
+            "version": mdcx.__version__,
+            "revision": revision(),
+            "python": platform.python_version(),
+            "scale": scale,
+            "repeat": repeat,
+        }
+        with open(out, "w") as file:
+            json.dump({"meta": meta, "results": results}, file, indent=2)
+        print(f"\nWrote results to {out}")
+
+
+def compare(old_path: Path, new_path: Path, threshold: float) -> bool:
+    """Compares two result files, returning if anything regressed past the threshold"""
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    print(f"{old['meta']['revision']} -> {new['meta']['revision']}")
+
+    # Compare each metric of the cases in both
+    regressed = False
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        for metric in PHASES + ["peak_memory"]:
+            before, after = old["results"][name][metric], result[metric]
+            change = (after - before) / before * 100 if before else 0.0
+            noise = metric != "peak_memory" and after - before < NOISE_FLOOR
+            flag = ""
+            if change > threshold and not noise:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"{name:<12} {metric:<12} {change:+7.1f}%{flag}")
+    return regressed
+
+
+def _option(args: list[str], name: str, default):
+    """Gets the value of a `--name value` option, removing it from `args`"""
+    if name not in args:
+        return default
+    ind = args.index(name)
+    value = type(default)(args[ind + 1])
+    del args[ind : ind + 2]
+    return value
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == "_memory":
+        _memory(args[1], int(args[2]))
+        sys.exit(0)
+    if not args or args[0] not in ("run", "compare"):
+        print(__doc__)
+        sys.exit(1)
+    if args[0] == "run":
+        scale = _option(args, "--scale", 1)
+        repeat = _option(args, "--repeat", 3)
+        run(Path(args[1]) if len(args) > 1 else None, scale, repeat)
+    else:
+        threshold = _option(args, "--threshold", 10.0)
+        if len(args) != 3:
+            print(__doc__)
+            sys.exit(1)
+        sys.exit(1 if compare(Path(args[1]), Path(args[2]), threshold) else 0)
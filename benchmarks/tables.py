@@ -0,0 +1,35 @@
+"""Benchmark for rendering tables of growing row counts, which should take about the same
+time per row however many rows there are
+
+Usage: python benchmarks/tables.py [rows?]"""
+
+import sys
+import timeit
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+header = (
+    "| Id | Name | Status | Amount | Notes |\n|---:|------|:------:|-------:|-------|"
+)
+for rows in (count // 50, count // 10, count):
+    body = "\n".join(
+        f"| {i} | Item *{i}* | ok | {i * 1.5:.2f} | [ref](https://example.com/{i % 20}) |"
+        for i in range(rows)
+    )
+    md = f"# Report\n\n{header}\n{body}\n"
+    parsed = min(timeit.repeat(lambda: Document(md, Path("tables.md")), number=1))
+    doc = Document(md, Path("tables.md"))
+    saves = {
+        name: min(timeit.repeat(lambda: doc.save(BytesIO(), streaming), number=1))
+        for name, streaming in (("docx", False), ("stream", True))
+    }
+    print(
+        f"{rows:>6} rows  parse {parsed / rows * 1e6:6.1f} us/row"
+        + "".join(
+            f"  {name} {secs / rows * 1e6:7.1f} us/row" for name, secs in saves.items()
+        )
+    )
@@ -0,0 +1,50 @@
+"""Benchmark for rebuilding a watched directory of documents, comparing building all of
+them to rebuilding after one document changes and after an image some of them share does
+
+Usage: python benchmarks/watch.py [files?]"""
+
+import shutil
+import sys
+import tempfile
+import timeit
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Style, _Poller, _Watcher
+
+IMAGE = Path(__file__).parent.parent / "examples" / "images" / "airbnb_icon.png"
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+with tempfile.TemporaryDirectory() as tmp:
+    # Documents of a few sections each, every tenth showing the shared image
+    src = Path(tmp) / "src"
+    src.mkdir()
+    shutil.copyfile(IMAGE, src / "shared.png")
+    para = "Some *italic*, **bold** and `code` words along with plain text. " * 10
+    for i in range(count):
+        lines = [f"# Document {i}"]
+        for j in range(20):
+            lines.extend([f"## Section {j}", para, "- A bullet\n- Another"])
+        if i % 10 == 0:
+            lines.append("![Shared figure](shared.png)")
+        (src / f"doc{i}.md").write_text("\n\n".join(lines))
+    watcher = _Watcher(
+        src, Path(tmp) / "out", Style.andy(), True, None, 0.0, _Poller(1.0)
+    )
+
+    # Time building everything, then rebuilding what each change affects
+    def rebuild(paths: set):
+        with redirect_stdout(StringIO()):
+            watcher._rebuild(paths)
+
+    took_all = timeit.timeit(lambda: rebuild(watcher._scan(watcher.src)), number=1)
+    one = watcher._affected({watcher.src / "doc1.md"})
+    took_one = min(timeit.repeat(lambda: rebuild(one), number=1, repeat=5))
+    shared = watcher._affected({watcher.src / "shared.png"})
+    took_shared = min(timeit.repeat(lambda: rebuild(shared), number=1, repeat=5))
+    print(
+        f"{count} files  build {took_all:6.3f}s  one changed {took_one:6.3f}s"
+        f"  image in {len(shared)} changed {took_shared:6.3f}s"
+    )
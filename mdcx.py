@@ -1,15 +1,87 @@
-from copy import copy
+from __future__ import annotations
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from copy import copy, deepcopy
+import gc
+import glob
+import hashlib
+import itertools
+from io import BytesIO
+import json
+import math
+import os
 from pathlib import Path
 import re
-import docx
-from docx.enum.style import WD_STYLE_TYPE
-from docx.enum.text import WD_BREAK
-from docx.shared import RGBColor, Pt, Cm
+import shutil
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Iterable
+import warnings
+import weakref
+import zipfile
+import zlib
 import sys
-import PIL.Image
 
+# python-docx is imported where it's needed so the command-line starts quickly
+if TYPE_CHECKING:
+    import docx
+    import docx.image.image
+
+__version__ = "0.1.0"
 STYLE_CODE = "Code"
-CLI_HELP = "Usage: mdcx [in] [out?]\n\n  Seamless markdown to docx converter\n\nArguments:\n  --foxtrot    Alternate document format"  # TODO: not just foxtrot
+STYLE_LINK = "Link"
+BLOCK_DOCUMENT = "document"
+BLOCK_METADATA = "metadata"
+BLOCK_COMMENT = "comment"
+BLOCK_HEADING = "heading"
+BLOCK_CODEBLOCK = "codeblock"
+BLOCK_QUOTE = "quote"
+BLOCK_BULLET = "bullet"
+BLOCK_IMAGE = "image"
+BLOCK_NUMBERED = "numbered"
+BLOCK_TABLE = "table"
+BLOCK_TOC = "toc"
+BLOCK_PARAGRAPH = "paragraph"
+BLOCK_BLANK = "blank"
+CLI_HELP = "Usage: mdcx [in] [out?]\n       mdcx batch [in...]\n       mdcx book [manifest] [out?]\n       mdcx serve\n       mdcx client [in] [out?]\n       mdcx watch [dir] [outdir?]\n\n  Seamless markdown to docx converter\n\nArguments:\n  --foxtrot      Alternate document format\n  --streaming    Stream docx xml straight to file\n  --jobs [n]     Processes to convert batches, parse chapters or huge files with\n  --cache        Reuse unchanged conversions from $MDCX_CACHE or ~/.cache/mdcx\n  --no-cache     Never use the cache, even if $MDCX_CACHE is set\n  --optimise     Downscale and recompress images to the size they're shown at\n  --update       Only re-render sections which changed since the last --update\n  --no-appendix  Link to local files instead of showing them in an appendix\n  --profile      Print a breakdown of where time went converting\n  --socket [p]   Unix socket to serve on, from $MDCX_SOCKET or a private default\n  --idle [s]     Seconds without jobs before serve stops, 600 by default\n  --stop         Stop the daemon a client is talking to\n  --settle [s]   Seconds changes settle for before watch rebuilds, 0.2 by default\n  --poll [s]     Check for changes every s seconds instead of using inotify"  # TODO: not just foxtrot
+_BLOCK_START = re.compile(
+    r"(<!--)|(#)|(```)|(>)|(-)|(!\[.*\]\(.+\))|([+-]?\d+(?:_\d+)*\s*\.)|(\|)"
+    r"|(\[TOC\](?:\s|$))"
+)
+_BLOCK_KINDS = (
+    None,
+    BLOCK_COMMENT,
+    BLOCK_HEADING,
+    BLOCK_CODEBLOCK,
+    BLOCK_QUOTE,
+    BLOCK_BULLET,
+    BLOCK_IMAGE,
+    BLOCK_NUMBERED,
+    BLOCK_TABLE,
+    BLOCK_TOC,
+)
+_TABLE_DELIMITER = re.compile(r"\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?")
+_TABLE_PIPE = re.compile(r"(?<!\\)\|")
+_W_NAMESPACE = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+_IMAGE = re.compile(r"!\[.*\]\(.+\)")
+_SLUG_STRIP = re.compile(r"[^\w\- ]")
+_URL_SCHEME = re.compile(r"[a-zA-Z][\w+.-]+:")
+_TOKEN_TEXT = 0
+_TOKEN_STARS = 1
+_TOKEN_CHEEKY = 2
+_TOKEN_LINK = 3
+_INLINE_SPECIAL = re.compile(r"[\\*<\[]")
+_INLINE_STARS = re.compile(r"\*+")
+_INLINE_CHEEKY = re.compile(r"<((?:\\.|[^\\>])*)>")
+_INLINE_ESCAPE = re.compile(r"\\(.)")
+_FORMAT_BOLD = 1
+_FORMAT_ITALIC = 2
+_FORMAT_UNDERLINE = 4
+_FORMAT_STRIKETHROUGH = 8
+_XML_RUN_SPECIAL = re.compile(r"([\t\r\n])")
+_XML_INVALID = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_XML_BOOKMARK_ID = re.compile(rb'(<w:bookmark(?:Start|End) w:id=")(\d+)')
+_XML_ATTR_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
 
 
 # TODO: private these properly
@@ -25,6 +97,8 @@ class Context:
         self.strikethrough = False
         self.figures = 0
         self.wd = wd
+        self.links = []
+        self.appendix = Appendix()
 
     def no_spacing(self) -> bool:
         """Checks if elements should have spacing within the current section"""
@@ -36,6 +110,10 @@ class Context:
         """Skips to the next line"""
         self.line += 1
         self.char = 0
+        self.clear_format()
+
+    def clear_format(self):
+        """Stops any bold, italic or other run formatting carrying on"""
         self.italic = False
         self.bold = False
         self.underline = False
@@ -49,17 +127,71 @@ class Context:
         """Flips bold value"""
         self.bold = not self.bold
 
+    def format(self) -> int:
+        """Packs current run formatting into bit flags"""
+        return (
+            (_FORMAT_BOLD if self.bold else 0)
+            | (_FORMAT_ITALIC if self.italic else 0)
+            | (_FORMAT_UNDERLINE if self.underline else 0)
+            | (_FORMAT_STRIKETHROUGH if self.strikethrough else 0)
+        )
+
     def link_to(self, link: str | Path) -> Path:
         """Gets link to something from the markdown file's directory"""
         return self.wd / link
 
+    def local_file(self, file: str) -> Path | None:
+        """Gets resolved path of a linked file which can go in the appendix, which has to
+        be inside of the markdown file's directory so documents can't show files from
+        anywhere else on the machine"""
+        if (
+            not self.appendix.enabled
+            or self.wd is None
+            or file == ""
+            or _URL_SCHEME.match(file)
+            or file.lower().endswith((".md", ".markdown"))
+        ):
+            return None
+        # Links which can't be paths here, like overly long ones, aren't files
+        try:
+            path = self.link_to(file).resolve()
+            if path.is_relative_to(self.wd.resolve()):
+                return path
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def appendix_link(self, link: str) -> str | None:
+        """Gets bookmark of the appendix entry a link points to instead if it's to a local
+        file, other than markdown which is a document of its own"""
+        linked = self.appendix.linked.get(link)
+        if linked is None:
+            anchor = None
+            file = link.partition("#")[0].partition("?")[0]
+            path = self.local_file(file)
+            try:
+                if path is not None and path.is_file():
+                    anchor = self.appendix.add(path, file)
+            except OSError:
+                path = None  # too long a name to be a file
+            linked = self.appendix.linked[link] = (anchor, path)
+        anchor, path = linked
+        if anchor is not None:
+            self.appendix.links.append(link)
+        elif path is not None:
+            self.appendix.missing.append(path)
+        return anchor
+
 
 class Heading:
-    """Heading section inside document"""
+    """Heading section inside document, bookmarked with its slug for internal links"""
+
+    __slots__ = ("text", "level", "slug")
 
-    def __init__(self, text: str, level: int) -> None:
+    def __init__(self, text: str, level: int, slug: str | None = None) -> None:
         self.text = text
         self.level = level
+        self.slug = slug
 
     def _md(line: str):
         # Parse number of # for level
@@ -76,29 +208,59 @@ class Heading:
             docx_doc.add_page_break()
         # Add heading
         docx_para = docx_doc.add_heading(self.text, self.level)
-        # TODO: bookmarks
-        # print(docx_para._element.xml)
-        # docx_para.insert(0, etree.XML("<hi />"))
+        # Bookmark it around its text
+        if self.slug is not None:
+            start, end = _Embeds.of(docx_doc.part).bookmark(self.slug)
+            docx_para._p.pPr.addnext(start)
+            docx_para._p.append(end)
+
+    def _xml(self, writer: "_Writer"):
+        # Page break for bibliography
+        if _is_bib(self.text):
+            writer.page_break()
+        # Add heading
+        style = "Title" if self.level == 0 else f"Heading {self.level}"
+        content = _xml_run(self.text) if self.text else ""
+        if self.slug is not None:
+            content = writer.bookmarked(self.slug, content)
+        writer.paragraph(content, style)
 
 
 class Run:
     """Run of text with styling located inside a paragraph"""
 
+    __slots__ = ("text", "format", "link", "link_external")
+
     def __init__(self, ctx: Context, text: str, **kwargs):
         # Check that run is a string; python doesn't have strong typing sadly
         if type(text) != str:
             raise Exception("Make sure this run is a string, this is a common mistake")
         # Create tuns
-        self.ctx = copy(ctx)
         self.text = text
+        self.format = ctx.format()
         self.link = None
         self.link_external = None
-        self.image = False
         # Link specialty
         if "link" in kwargs:
             self.link = kwargs["link"][0]
             self.link_external = kwargs["link"][1]
 
+    @property
+    def bold(self) -> bool:
+        return bool(self.format & _FORMAT_BOLD)
+
+    @property
+    def italic(self) -> bool:
+        return bool(self.format & _FORMAT_ITALIC)
+
+    @property
+    def underline(self) -> bool:
+        return bool(self.format & _FORMAT_UNDERLINE)
+
+    @property
+    def strikethrough(self) -> bool:
+        return bool(self.format & _FORMAT_STRIKETHROUGH)
+
     def _docx(self, docx_para: docx.text.paragraph.Paragraph) -> docx.text.run.Run:
         # Act different if it's a link
         if self.link is not None:
@@ -106,23 +268,34 @@ class Run:
         # Add plain run text
         docx_run = docx_para.add_run(self.text)
         # Add relevant styles
-        if self.ctx.bold:
+        if self.bold:
             docx_run.bold = True
-        if self.ctx.italic:
+        if self.italic:
             docx_run.italic = True
-        if self.ctx.underline:
+        if self.underline:
             docx_run.underline = True
-        if self.ctx.strikethrough:
+        if self.strikethrough:
             docx_run.strikethrough = True
         return docx_run
 
+    def _xml(self, writer: "_Writer") -> str:
+        # Act different if it's a link
+        if self.link is not None:
+            return writer.link(self.link, self.text, self.link_external)
+        # Plain run text with relevant styles
+        return _xml_run(
+            self.text, self.bold, self.italic, self.underline, self.strikethrough
+        )
+
 
 class Paragraph:
     """Paragraph consisting of many runs of text"""
 
-    def __init__(self, ctx: Context, runs: list = []):
-        self.ctx = ctx
-        self.runs = runs
+    __slots__ = ("runs", "no_spacing")
+
+    def __init__(self, ctx: Context, runs: list | None = None):
+        self.runs = runs if runs is not None else []
+        self.no_spacing = ctx.no_spacing()
 
     def append(self, run: Run):
         """Appends new run to paragraph"""
@@ -132,145 +305,252 @@ class Paragraph:
     def _md(ctx: Context, line: str):
         # Metadata
         runs = []
-        ind = 0
-        flipflop = False
-        buf = ""
-
-        # Go through each character
-        while ind < len(line):
-            # Flipflops
-            if flipflop:
-                buf += line[ind]
-                ind += 1
-                flipflop = False
-            # Backslash for flipflop
-            elif line[ind] == "\\":
-                flipflop = True
+        buf = []
+
+        # Go through each token
+        for kind, value in _inline_tokens(line):
+            # Plain text
+            if kind == _TOKEN_TEXT:
+                buf.append(value)
+                continue
+            # Clear buf
+            if buf:
+                runs.append(Run(ctx, "".join(buf)))
+                buf = []
             # Bold/italics
-            elif line[ind] == "*":
-                # Clear buf
-                runs.append(Run(ctx, buf))
-                buf = ""
-                # Parse
-                ind += _run_ib(ctx, line[ind:])
+            if kind == _TOKEN_STARS:
+                _run_ib(ctx, value)
             # Cheeky link
-            elif line[ind] == "<" and ">" in line[ind:]:
-                # Clear buf
-                runs.append(Run(ctx, buf))
-                buf = ""
-                # Parse
-                res = _run_cheeky(ctx, line[ind:])
-                ind += res[0]
-                runs.append(res[1])
-            # Misc
+            elif kind == _TOKEN_CHEEKY:
+                runs.append(Run(ctx, value, link=(value, True)))
+            # Link
             else:
-                # Find instances of link
-                match = re.search(
-                    r"^\[.+\]\(.*\)",
-                    line[ind:],
-                )
-
-                # Link
-                if match:
-                    # Finish existing buffer and skip link
-                    runs.append(Run(ctx, buf))
-                    buf = ""
-                    ind += len(match.group(0))
-                    # Parse components
-                    splitted = match.group(0).split("](", 1)
-                    link = splitted[1][:-1].strip()
-                    # Add link
-                    if link.startswith("#"):
-                        # Internal link
-                        text = splitted[0][1:]
-                        runs.append(Run(ctx, text, link=(link[1:], False)))
+                text, link = value  # TODO: parse markdown rather than raw text
+                if link.startswith("#"):
+                    # Internal link, checked against headings once parsed
+                    runs.append(Run(ctx, text, link=(link[1:], False)))
+                    ctx.links.append(link[1:])
+                else:
+                    # Local file shown in the appendix, otherwise external link
+                    anchor = ctx.appendix_link(link)
+                    if anchor is not None:
+                        runs.append(Run(ctx, text, link=(anchor, False)))
                     else:
-                        # External link
-                        text = splitted[0][
-                            1:
-                        ]  # TODO: parse markdown rather than raw text
-                        # TODO: include local uris as an automatic appendix :)
                         runs.append(Run(ctx, text, link=(link, True)))
 
-                # Normal character
-                else:
-                    buf += line[ind]
-                    ind += 1
-
         # Create paragraph and return
-        runs.append(Run(ctx, buf))
+        if buf:
+            runs.append(Run(ctx, "".join(buf)))
         return Paragraph(ctx, runs)
 
     def _docx(self, docx_doc: docx.Document) -> docx.text.paragraph.Paragraph:
         # Add empty paragraph
         docx_para = docx_doc.add_paragraph()
         # Make no-spaced if defined
-        if self.ctx.no_spacing():
+        if self.no_spacing:
             docx_para.style = "No Spacing"
         # Add runs to paragraph
         for run in self.runs:
             run._docx(docx_para)
         return docx_para
 
+    def _xml(self, writer: "_Writer", style: str = None, props: str = ""):
+        # Make no-spaced if defined and not styled otherwise
+        if style is None and self.no_spacing:
+            style = "No Spacing"
+        # Add paragraph with runs
+        runs = "".join(run._xml(writer) for run in self.runs)
+        writer.paragraph(runs, style, props)
+
 
 class Codeblock:
-    """Codeblock containing language and monospaced code"""
+    """Codeblock containing language and monospaced code, coloured by pygments in the
+    `theme` if it's installed and knows the language. Codeblocks longer than
+    `COMPACT_LINES` are rendered as one paragraph with line breaks instead of a paragraph
+    per line, which looks the same but makes for much less xml"""
 
-    def __init__(self, lines: list, lang: str = None, heading_after: bool = False):
+    __slots__ = ("lines", "lang", "heading_after", "theme")
+    COMPACT_LINES = 500
+
+    def __init__(
+        self,
+        lines: list,
+        lang: str = None,
+        heading_after: bool = False,
+        theme: str | None = None,
+    ):
         self.lines = lines
-        self.lang = lang  # TODO: use somewhere in docx
+        self.lang = lang
         self.heading_after = heading_after
+        self.theme = theme
 
     @staticmethod
-    def _md(lines: list) -> tuple:
+    def _md(lines: list, after: str | None, theme: str | None = None):
         # Get language after ``` designator
-        lang = (
-            lines[0].lstrip()[3:].lstrip()
-        )  # first `lstrip()` used in document parsing
+        lang = lines[0].lstrip()[3:].lstrip()  # first `lstrip()` used in scanning
         lang = lang if lang != "" else None
 
-        # Read lines
-        heading_after = False
-        code = []
-        for ind, line in enumerate(lines[1:]):
-            if line.lstrip() == "```":
-                # Check if there's a heading afterwards
-                if len(lines[1:]) - 1 > ind and lines[ind + 2].lstrip().startswith("#"):
-                    heading_after = True
-                # Stop codeblock
-                break
-            else:
-                code.append(line)
+        # Get code between fences, checking if there's a heading after a closed block
+        closed = len(lines) > 1 and lines[-1].lstrip() == "```"
+        code = lines[1:-1] if closed else lines[1:]
+        heading_after = closed and after is not None and after.lstrip().startswith("#")
+        return Codeblock(code, lang, heading_after, theme)
 
-        # Get skip
-        skip = len(code) + 1
-        return (Codeblock(code, lang, heading_after), skip)
+    def _runs(self) -> list[list[tuple]]:
+        """Gets runs of `(text, color, bold, italic)` for each line after its number,
+        coloured if they can be"""
+        highlighted = None
+        if self.lang is not None and self.theme is not None:
+            highlighted = _highlight(self.lines, self.lang, self.theme)
+        if highlighted is None:
+            return [[(" " + line, None, False, False)] for line in self.lines]
+        # Space lines out from their numbers
+        spaced = []
+        for runs in highlighted:
+            if runs:
+                text, color, bold, italic = runs[0]
+                spaced.append([(" " + text, color, bold, italic), *runs[1:]])
+            else:
+                spaced.append([(" ", None, False, False)])
+        return spaced
 
     def _docx(self, docx_doc: docx.Document):
+        from docx.shared import RGBColor
+
         # Calculate justification for lines
         just = len(str(len(self.lines)))
-        # Add lines
-        for ind, line in enumerate(self.lines):
-            # Figure out line number
-            num = str(ind + 1).rjust(just)
-            # Add new paragraph with code style
-            docx_para = docx_doc.add_paragraph()
-            docx_para.style = STYLE_CODE
+        compact = len(self.lines) > self.COMPACT_LINES
+        last = len(self.lines) - 1
+        for ind, runs in enumerate(self._runs()):
+            # Add new paragraph with code style, or only the first if compact
+            if not compact or ind == 0:
+                docx_para = docx_doc.add_paragraph()
+                docx_para.style = STYLE_CODE
             # Add line number with italics
-            docx_run = docx_para.add_run(num)
+            docx_run = docx_para.add_run(str(ind + 1).rjust(just))
             docx_run.font.italic = True
-            # Add actual code
-            docx_para.add_run(" " + line)
+            # Add actual code, breaking onto the next line if compact
+            for run_ind, (text, color, bold, italic) in enumerate(runs):
+                if compact and ind != last and run_ind == len(runs) - 1:
+                    text += "\n"
+                docx_run = docx_para.add_run(text)
+                if bold:
+                    docx_run.bold = True
+                if italic:
+                    docx_run.italic = True
+                if color is not None:
+                    docx_run.font.color.rgb = RGBColor.from_string(color)
 
         # Add small codeblock line for formatting if there's not a heading afterwards
         if not self.heading_after:
             docx_para = docx_doc.add_paragraph()
             docx_para.style = STYLE_CODE
 
+    def _xml(self, writer: "_Writer"):
+        # Calculate justification for lines
+        just = len(str(len(self.lines)))
+        # Get each line with an italic line number
+        lines = [
+            _xml_run(str(ind + 1).rjust(just), italic=True)
+            + "".join(
+                _xml_run(text, bold, italic, color=color)
+                for text, color, bold, italic in runs
+            )
+            for ind, runs in enumerate(self._runs())
+        ]
+        # Add lines as one paragraph with breaks if there's lots of them
+        if len(self.lines) > self.COMPACT_LINES:
+            br = "<w:br/></w:r>"
+            lines = [line[: -len("</w:r>")] + br for line in lines[:-1]] + lines[-1:]
+            writer.paragraph("".join(lines), STYLE_CODE)
+        # Add lines as their own paragraphs
+        else:
+            for line in lines:
+                writer.paragraph(line, STYLE_CODE)
+
+        # Add small codeblock line for formatting if there's not a heading afterwards
+        if not self.heading_after:
+            writer.paragraph("", STYLE_CODE)
+
+
+_highlighted = OrderedDict()
+_highlighted_lock = threading.Lock()
+_HIGHLIGHTED_MAX = 256
+
+
+def _highlight(lines: list[str], lang: str, theme: str) -> list[list[tuple]] | None:
+    """Gets runs of `(text, color, bold, italic)` for each line of code coloured by pygments,
+    with neighbouring tokens that look the same merged into one run. Memoised by language,
+    hash of the code and theme; gets `None` if pygments isn't installed or the language
+    isn't known"""
+    code = "\n".join(lines)
+    key = (lang, hashlib.sha1(code.encode()).digest(), theme)
+    with _highlighted_lock:
+        highlighted = _highlighted.get(key)
+        if highlighted is not None:
+            _highlighted.move_to_end(key)
+            return highlighted
+
+    # Get lexer and style if they're there
+    try:
+        from pygments.lexers import get_lexer_by_name
+        from pygments.styles import get_style_by_name
+        from pygments.util import ClassNotFound
+    except ImportError:
+        return None
+    try:
+        lexer = get_lexer_by_name(lang.split()[0], stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+    try:
+        style = get_style_by_name(theme)
+    except ClassNotFound:
+        raise Exception(f"Code theme {theme} isn't available in pygments")
+
+    # Tokenise once, merging tokens into runs per line
+    formats = {}
+    highlighted = [[]]
+    for kind, value in lexer.get_tokens(code):
+        fmt = formats.get(kind)
+        if fmt is None:
+            # Lexers can make their own token types, which look like the nearest parent
+            styled = kind
+            while not style.styles_token(styled):
+                styled = styled.parent
+            token = style.style_for_token(styled)
+            color = token["color"].upper() if token["color"] else None
+            fmt = formats[kind] = (color, token["bold"], token["italic"])
+        for ind, part in enumerate(value.split("\n")):
+            if ind != 0:
+                highlighted.append([])
+            if part == "":
+                continue
+            # Spaces look the same in any format so they join the runs around them
+            runs = highlighted[-1]
+            if not runs:
+                runs.append((part, *fmt))
+            elif runs[-1][1:] == fmt or part.isspace():
+                runs[-1] = (runs[-1][0] + part, *runs[-1][1:])
+            elif runs[-1][0].isspace():
+                runs[-1] = (runs[-1][0] + part, *fmt)
+            else:
+                runs.append((part, *fmt))
+    if len(highlighted) != len(lines):
+        return None
+
+    # Remember for next time
+    with _highlighted_lock:
+        _highlighted[key] = highlighted
+        if len(_highlighted) > _HIGHLIGHTED_MAX:
+            _highlighted.popitem(last=False)
+    return highlighted
+
 
 class Quote(Paragraph):
     """Quote of something in it's own style"""
 
+    __slots__ = ("level",)
+
     @staticmethod
     def _md(ctx: Context, line: str):
         # Level info
@@ -290,16 +570,28 @@ class Quote(Paragraph):
         # Get inherited generated paragraph
         para = super()._docx(docx_doc)
         # Reset to quote styling
+        from docx.shared import Cm
+
         para.style = "Quote"
         INDENT = 0.75
         para.paragraph_format.left_indent = Cm(INDENT * self.level + 1)
         para.paragraph_format.right_indent = Cm(INDENT)
         return para
 
+    def _xml(self, writer: "_Writer"):
+        from docx.shared import Cm
+
+        INDENT = 0.75
+        left = Cm(INDENT * self.level + 1).twips
+        right = Cm(INDENT).twips
+        super()._xml(writer, "Quote", f'<w:ind w:left="{left}" w:right="{right}"/>')
+
 
 class PointBullet(Paragraph):
     """Bullet point with content inside of it"""
 
+    __slots__ = ("level",)
+
     @staticmethod
     def _md(ctx: Context, line: str):
         # Level info
@@ -324,10 +616,17 @@ class PointBullet(Paragraph):
         )
         return docx_para
 
+    def _xml(self, writer: "_Writer"):
+        super()._xml(
+            writer, "List Bullet" if self.level == 0 else f"List Bullet {self.level+1}"
+        )
+
 
 class PointNumbered(Paragraph):
     """Numbered point with content inside of it"""
 
+    __slots__ = ("level", "num")
+
     @staticmethod
     def _md(ctx: Context, line: str):
         # Level info
@@ -347,7 +646,8 @@ class PointNumbered(Paragraph):
         return numbered
 
     def _docx(self, docx_doc: docx.Document) -> docx.text.paragraph.Paragraph:
-        # TODO: use something like "start at self.num" so markdown starting at like `20.` can be used, it fucks up otherwise
+        # TODO: use something like "start at self.num" so markdown starting at like `20.`
+        # can be used, it fucks up otherwise
         # Get inherited generated paragraph
         docx_para = super()._docx(docx_doc)
         # Set bullet style according to level
@@ -356,10 +656,17 @@ class PointNumbered(Paragraph):
         )
         return docx_para
 
+    def _xml(self, writer: "_Writer"):
+        super()._xml(
+            writer, "List Number" if self.level == 0 else f"List Number {self.level+1}"
+        )
+
 
 class Image:
     """Image with some optional caption text"""
 
+    __slots__ = ("link", "caption")
+
     def __init__(self, ctx: Context, link: str, caption: Paragraph = None) -> None:
         # Get and check image link
         real_link = ctx.link_to(link)
@@ -367,11 +674,13 @@ class Image:
             raise Exception(f"Image linked to as {link} does not exist")
 
         # Set other values
-        self.ctx = ctx
         self.link = real_link
-        self.safe_link = str(real_link.absolute())
         self.caption = caption
 
+    @property
+    def safe_link(self) -> str:
+        return str(self.link.absolute())
+
     @staticmethod
     def _md(ctx: Context, matched: str):
         splitted = matched.split("](")
@@ -382,22 +691,18 @@ class Image:
         else:
             caption = None
         link = splitted[1][:-1].strip()
-        return Image(copy(ctx), link, caption)
+        return Image(ctx, link, caption)
 
     def _docx(self, docx_doc: docx.Document) -> list[docx.text.paragraph.Paragraph]:
-        # Get image width/heigth
-        img = PIL.Image.open(self.link)
-        width, height = (img.width, img.height)
-
         # Insert image
+        embeds = _Embeds.of(docx_doc.part)
         docx_para_image = docx_doc.add_paragraph()
         docx_run = docx_para_image.add_run()
         try:
-            # Width/height adjustment so it won't fall off the page
-            if height > width:
-                docx_run.add_picture(self.safe_link, height=Cm(10))
-            else:
-                docx_run.add_picture(self.safe_link, width=Cm(12))
+            # Get image with width/height read from its header
+            image = embeds.images.get(self.link)
+            width, height = _picture_size(image.px_width, image.px_height)
+            embeds.picture(docx_run, image, width, height)
         except Exception as e:
             raise Exception(f"Failed to add image {self.link} to document ({e})")
 
@@ -409,6 +714,536 @@ class Image:
             return [docx_para_image, docx_para_caption]
         return [docx_para_image]
 
+    def _xml(self, writer: "_Writer"):
+        # Insert image
+        try:
+            # Get image with width/height read from its header
+            image = writer.images.get(self.link)
+            width, height = _picture_size(image.px_width, image.px_height)
+            picture = writer.picture(image, width, height)
+        except Exception as e:
+            raise Exception(f"Failed to add image {self.link} to document ({e})")
+        writer.paragraph(picture)
+
+        # Add caption
+        if self.caption:
+            self.caption._xml(writer, "Caption")
+
+
+class Table:
+    """Table of paragraphs in cells with a header row, and alignments for each column of
+    `"left"`, `"center"`, `"right"` or `None`. Rows are built as xml directly rather than
+    through python-docx's table api so big tables render in linear time"""
+
+    __slots__ = ("header", "rows", "aligns")
+
+    def __init__(self, header: list, rows: list[list], aligns: list) -> None:
+        self.header = header
+        self.rows = rows
+        self.aligns = aligns
+
+    @staticmethod
+    def _md(ctx: Context, lines: list):
+        # Get alignments from delimiter row
+        aligns = []
+        for cell in _table_cells(lines[1]):
+            if cell.startswith(":") and cell.endswith(":"):
+                aligns.append("center")
+            elif cell.endswith(":"):
+                aligns.append("right")
+            elif cell.startswith(":"):
+                aligns.append("left")
+            else:
+                aligns.append(None)
+
+        # Parse cells in each row, with as many as the header has
+        rows = []
+        for line in [lines[0], *lines[2:]]:
+            cells = _table_cells(line)[: len(aligns)]
+            cells += [""] * (len(aligns) - len(cells))
+            row = []
+            for cell in cells:
+                row.append(Paragraph._md(ctx, cell))
+                ctx.clear_format()
+            rows.append(row)
+
+        # Embolden header
+        for para in rows[0]:
+            for run in para.runs:
+                run.format |= _FORMAT_BOLD
+        return Table(rows[0], rows[1:], aligns)
+
+    def _widths(self, text_width: int) -> list[int]:
+        """Gets width of each column in twips, shared out by how long their text is"""
+        weights = [3] * len(self.aligns)
+        for row in [self.header, *self.rows]:
+            for ind, para in enumerate(row):
+                length = sum(len(run.text) for run in para.runs) + 3
+                if length > weights[ind]:
+                    weights[ind] = min(length, 40)
+        total = sum(weights)
+        return [text_width * weight // total for weight in weights]
+
+    def _xml_rows(self, style_id: str, text_width: int, cells: Iterable[str]) -> str:
+        """Gets table xml with the content of each cell's paragraph in order"""
+        widths = self._widths(text_width)
+        cells = iter(cells)
+        xml = [
+            f'<w:tbl><w:tblPr><w:tblStyle w:val="{style_id}"/>'
+            f'<w:tblW w:w="{sum(widths)}" w:type="dxa"/><w:tblLayout w:type="fixed"/>'
+            '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1"'
+            ' w:lastColumn="0" w:noHBand="0" w:noVBand="1"/></w:tblPr><w:tblGrid>',
+            *(f'<w:gridCol w:w="{width}"/>' for width in widths),
+            "</w:tblGrid>",
+        ]
+        # Get start and paragraph properties of each column's cells once
+        columns = []
+        for width, align in zip(widths, self.aligns):
+            start = f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>'
+            props = f'<w:pPr><w:jc w:val="{align}"/></w:pPr>' if align else ""
+            columns.append((start, props))
+        # Add rows, repeating the header on each page
+        for ind in range(len(self.rows) + 1):
+            xml.append(
+                "<w:tr><w:trPr><w:tblHeader/></w:trPr>" if ind == 0 else "<w:tr>"
+            )
+            for start, props in columns:
+                content = next(cells)
+                if props or content:
+                    xml.append(f"{start}<w:p>{props}{content}</w:p></w:tc>")
+                else:
+                    xml.append(f"{start}<w:p/></w:tc>")
+            xml.append("</w:tr>")
+        xml.append("</w:tbl>")
+        return "".join(xml)
+
+    def _docx(self, docx_doc: docx.Document):
+        from docx.oxml import parse_xml
+        from docx.oxml.shared import qn
+        from docx.text.paragraph import Paragraph as DocxParagraph
+
+        # Add empty table in one go
+        style_id = docx_doc.styles["Table Grid"].style_id
+        xml = self._xml_rows(style_id, _text_width(docx_doc), itertools.repeat(""))
+        tbl = parse_xml(xml.replace("<w:tbl>", f"<w:tbl {_W_NAMESPACE}>", 1))
+        docx_doc.element.body.sectPr.addprevious(tbl)
+
+        # Add runs to each cell's paragraph
+        body = docx_doc._body
+        paras = tbl.iter(qn("w:p"))
+        for row in [self.header, *self.rows]:
+            for para in row:
+                docx_para = DocxParagraph(next(paras), body)
+                for run in para.runs:
+                    run._docx(docx_para)
+
+    def _xml(self, writer: "_Writer"):
+        cells = (
+            "".join(run._xml(writer) for run in para.runs)
+            for row in [self.header, *self.rows]
+            for para in row
+        )
+        style_id = writer._template.style_ids["Table Grid"]
+        writer.write(self._xml_rows(style_id, writer._template.text_width, cells))
+
+
+class Toc:
+    """Table of contents as a Word field over headings down to `MAX_LEVEL`, filled in from
+    the document's anchors so its entries link to them before Word first updates it"""
+
+    __slots__ = ("title", "anchors")
+
+    MAX_LEVEL = 3
+
+    def __init__(self, title: str, anchors: dict) -> None:
+        self.title = title
+        self.anchors = anchors
+
+    @staticmethod
+    def _md(line: str, anchors: dict):
+        # Title is anything after the marker
+        title = line.strip()[len("[TOC]") :].strip()
+        return Toc(title if title else "Contents", anchors)
+
+    def _paragraphs(self, style_ids: dict) -> list[str]:
+        """Gets xml of each paragraph, with entries for headings parsed by now"""
+        # Title and start of field, which Word updates with page numbers when opened
+        field = (
+            '<w:r><w:fldChar w:fldCharType="begin" w:dirty="true"/></w:r>'
+            '<w:r><w:instrText xml:space="preserve">'
+            f' TOC \\o "1-{self.MAX_LEVEL}" \\h \\z \\u </w:instrText></w:r>'
+            '<w:r><w:fldChar w:fldCharType="separate"/></w:r>'
+        )
+        end = '<w:r><w:fldChar w:fldCharType="end"/></w:r>'
+        paras = [
+            f'<w:p><w:pPr><w:pStyle w:val="{style_ids["TOC Heading"]}"/></w:pPr>'
+            f"{_xml_run(self.title)}</w:p>"
+        ]
+
+        # Link to each heading straight from the index
+        headings = [
+            heading
+            for heading in self.anchors.values()
+            if heading.level <= self.MAX_LEVEL
+        ]
+        if not headings:
+            return paras + [f"<w:p>{field}{end}</w:p>"]
+        for ind, heading in enumerate(headings):
+            style_id = style_ids[f"toc {heading.level}"]
+            paras.append(
+                f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>'
+                + (field if ind == 0 else "")
+                + f'<w:hyperlink w:anchor="{_xml_attr(_bookmark_name(heading.slug))}"'
+                ' w:history="1">'
+                f"{_xml_run(heading.text)}</w:hyperlink>"
+                + (end if ind == len(headings) - 1 else "")
+                + "</w:p>"
+            )
+        return paras
+
+    def _docx(self, docx_doc: docx.Document):
+        from docx.oxml import parse_xml
+
+        style_ids = {style.name: style.style_id for style in docx_doc.styles}
+        body = docx_doc.element.body
+        for para in self._paragraphs(style_ids):
+            para = parse_xml(para.replace("<w:p>", f"<w:p {_W_NAMESPACE}>", 1))
+            body.sectPr.addprevious(para)
+
+    def _xml(self, writer: "_Writer"):
+        for para in self._paragraphs(writer._template.style_ids):
+            writer.write(para)
+
+
+class Appendix:
+    """Local files linked to from a document, shown as numbered entries after everything
+    else which every link to the same file points at. Each file is read once across a
+    thread pool as soon as it's first linked to, so reading carries on alongside parsing.
+    Text past `MAX_BYTES` is cut off and binary files are only summarised"""
+
+    MAX_BYTES = 64 * 1024
+
+    def __init__(self) -> None:
+        # Entries of `[number, name, read]` by path, where read is a future until finished
+        self.files = {}
+        self.linked = {}
+        self.links = []
+        # Local files linked to which weren't there, so whatever keeps the document can
+        # tell once they are
+        self.missing = []
+        self.start = None
+        # Whether links to local files go in the appendix at all
+        self.enabled = True
+        # Whether files are read as they're added, or left to whoever merges this appendix
+        self.reading = True
+        self._pool = None
+
+    def add(self, path: Path, name: str, read: tuple | None = None) -> str:
+        """Adds file at resolved `path` if it's not there already, queueing it to be read
+        unless it already has been, and gets the bookmark of its entry. Bookmarks come from
+        the path so they stay the same wherever the file ends up being numbered"""
+        entry = self.files.get(path)
+        if entry is None:
+            if read is None and self.reading:
+                if self._pool is None:
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    self._pool = ThreadPoolExecutor(thread_name_prefix="mdcx-appendix")
+                read = self._pool.submit(_appendix_read, path, self.MAX_BYTES)
+            self.files[path] = [len(self.files) + 1, name, read]
+        return _appendix_anchor(path)
+
+    def finish(self):
+        """Waits for every file to be read, so the appendix can be rendered or pickled"""
+        if self._pool is None:
+            return
+        for entry in self.files.values():
+            if not isinstance(entry[2], tuple):
+                entry[2] = entry[2].result()
+        self._pool.shutdown()
+        self._pool = None
+
+    def elements(self, theme: str | None) -> list:
+        """Gets elements showing each file under a heading bookmarked for links to it"""
+        self.finish()
+        if not self.files:
+            return []
+        # Notes are spaced the same whatever section the document ended in
+        ctx = Context()
+        elements = [Heading("Appendix", 1)]
+        last = len(self.files)
+        for path, (num, name, (lines, shown, size)) in self.files.items():
+            elements.append(Heading(f"{num}. {name}", 2, _appendix_anchor(path)))
+            # Summarise binary files
+            if lines is None:
+                note = f"Binary file of {size:,} bytes which isn't shown."
+                elements.append(Paragraph(ctx, [Run(ctx, note)]))
+                continue
+            # Show text as code, noting if it's been cut off
+            lang = Path(name).suffix[1:] or None
+            cut = shown < size
+            elements.append(Codeblock(lines, lang, not cut and num != last, theme))
+            if cut:
+                note = f"Cut off after the first {shown:,} of {size:,} bytes."
+                elements.append(Paragraph(ctx, [Run(ctx, note)]))
+        return elements
+
+
+class ImageOptimiser:
+    """Downscales images to `dpi` at the size they're shown at in the document, optionally
+    re-encoding them as `"jpeg"` or optimised `"png"`. Results are kept in the `cache`
+    directory if given, keyed by the source image's hash and these settings"""
+
+    def __init__(
+        self,
+        dpi: int = 150,
+        format: str | None = None,
+        quality: int = 85,
+        cache: Path | None = None,
+        workers: int | None = None,
+    ) -> None:
+        if format not in (None, "jpeg", "png"):
+            raise Exception(f"Image format {format} isn't supported, use jpeg or png")
+        self.dpi = dpi
+        self.format = format
+        self.quality = quality
+        self.cache = Path(cache) if cache is not None else None
+        self.workers = workers
+
+    def _params(self) -> tuple:
+        """Gets settings which change the optimised images"""
+        return (self.dpi, self.format, self.quality)
+
+    def optimise(self, path: Path) -> docx.image.image.Image:
+        """Gets optimised version of the image at `path`"""
+        import docx.image.image
+
+        # Get cached optimisation
+        path = Path(path)
+        blob = path.read_bytes()
+        key = hashlib.sha256(blob)
+        key.update(repr(self._params()).encode())
+        key = key.hexdigest()
+        cached = self.cache / key if self.cache is not None else None
+        if cached is not None and cached.exists():
+            blob = cached.read_bytes()
+            ext = docx.image.image.Image.from_blob(blob).ext
+            return _image_named(blob, f"{path.stem}.{ext}")
+
+        # Optimise and cache it
+        optimised = self._optimise(blob)
+        if optimised is None:
+            return _image_named(blob, path.name)
+        blob, ext = optimised
+        if cached is not None:
+            self.cache.mkdir(parents=True, exist_ok=True)
+            tmp = cached.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(blob)
+            os.replace(tmp, cached)
+        return _image_named(blob, f"{path.stem}.{ext}")
+
+    def _optimise(self, blob: bytes) -> tuple | None:
+        """Resamples and re-encodes image, giving `None` if the original should be kept"""
+        import PIL.Image
+
+        # Open image
+        try:
+            img = PIL.Image.open(BytesIO(blob))
+            img.load()
+        except Exception:
+            return None
+        source_format = img.format
+        format = self.format or ("jpeg" if source_format == "JPEG" else "png")
+
+        # Resample down to the pixels needed at the size it's shown at
+        width, height = _picture_size(img.width, img.height)
+        if width is not None:
+            size = math.ceil(width.inches * self.dpi)
+            size = (size, max(1, round(img.height * size / img.width)))
+        else:
+            size = math.ceil(height.inches * self.dpi)
+            size = (max(1, round(img.width * size / img.height)), size)
+        resized = size[0] < img.width
+        if not resized and format.upper() == source_format and self.format is None:
+            return None
+        if img.mode not in ("RGB", "RGBA", "L"):
+            img = img.convert("RGBA")
+        if resized:
+            img = img.resize(size, PIL.Image.LANCZOS)
+
+        # Re-encode
+        out = BytesIO()
+        if format == "jpeg":
+            if img.mode == "RGBA":
+                flat = PIL.Image.new("RGB", img.size, (255, 255, 255))
+                flat.paste(img, mask=img.getchannel("A"))
+                img = flat
+            img.save(out, "JPEG", quality=self.quality, optimize=True)
+        else:
+            img.save(out, "PNG", optimize=True)
+
+        # Keep original if it's already smaller at the same size
+        if not resized and out.tell() >= len(blob):
+            return None
+        return (out.getvalue(), "jpg" if format == "jpeg" else "png")
+
+
+class ImageCache:
+    """Images read from disk with their headers parsed, which can be shared between saves so
+    each file is only read once; least recently used images are dropped past `max_size` bytes.
+    Images are also passed through the `optimiser` if there is one"""
+
+    def __init__(
+        self,
+        max_size: int = 256 * 1024 * 1024,
+        optimiser: ImageOptimiser | None = None,
+    ) -> None:
+        self.max_size = max_size
+        self.optimiser = optimiser
+        self._images = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> docx.image.image.Image:
+        """Gets image at `path`, only reading it if it's not cached or has changed on disk"""
+        # Get cached image if it's unchanged
+        key = self._key(path)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+
+        # Read image and cache it
+        profile = _profiling.profile
+        if profile is not None:
+            profile.start()
+        if self.optimiser is not None:
+            image = self.optimiser.optimise(path)
+        else:
+            import docx.image.image
+
+            image = docx.image.image.Image.from_file(str(path))
+        if profile is not None:
+            profile.stop("images read", len(image.blob))
+        self._add(key, image)
+        return image
+
+    def prefetch(self, paths: Iterable[Path]):
+        """Optimises images ahead of time across a thread pool, if there's an optimiser"""
+        if self.optimiser is None:
+            return
+        # Get images which need optimising
+        missing = {}
+        for path in paths:
+            key = self._key(path)
+            if key not in self._images:
+                missing[key] = path
+        if len(missing) < 2:
+            return
+        # Optimise them all at once
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(self.optimiser.workers) as pool:
+            images = pool.map(self.optimiser.optimise, missing.values())
+            for key, image in zip(missing.keys(), images):
+                self._add(key, image)
+
+    def _key(self, path: Path) -> tuple:
+        """Gets key for image at `path` which changes if the file does"""
+        stat = os.stat(path)
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+
+    def _add(self, key: tuple, image: docx.image.image.Image):
+        """Adds image to the cache"""
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self._size -= len(old.blob)
+            self._images[key] = image
+            self._size += len(image.blob)
+
+            # Drop least recently used images over the size limit
+            while self._size > self.max_size:
+                _, dropped = self._images.popitem(last=False)
+                self._size -= len(dropped.blob)
+
+
+class Profile:
+    """Timings, counts and byte sizes of each phase of conversions in this thread while
+    it's active, optionally passing each timing to a `callback` of name, seconds and size
+    as it's taken. Times don't include time spent in phases nested inside of them"""
+
+    def __init__(self, callback: Callable[[str, float, int], None] | None = None):
+        self.callback = callback
+        self.stats = {}
+        self._stack = []
+        self._prev = None
+
+    def __enter__(self):
+        self._prev = _profiling.profile
+        _profiling.profile = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _profiling.profile = self._prev
+
+    def start(self):
+        """Starts timing a phase, which is stopped and named by `stop`"""
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def stop(self, name: str, size: int = 0):
+        """Stops timing the latest phase started, adding it to stats under `name`"""
+        start, nested = self._stack.pop()
+        took = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][1] += took
+        took -= nested
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0.0, 0]
+        stat[0] += 1
+        stat[1] += took
+        stat[2] += size
+        if self.callback is not None:
+            self.callback(name, took, size)
+
+    def iter(self, name: str, items: Iterable) -> Iterable:
+        """Yields items, timing how long each takes to get under `name`"""
+        items = iter(items)
+        while True:
+            self.start()
+            try:
+                item = next(items)
+            except StopIteration:
+                self._stack.pop()
+                return
+            self.stop(name)
+            yield item
+
+    def table(self) -> str:
+        """Formats stats as a table of phases, slowest first"""
+        total = sum(stat[1] for stat in self.stats.values()) or 1.0
+        rows = [f"{'phase':<24} {'count':>8} {'time':>10} {'%':>6} {'bytes':>12}"]
+        for name, (count, secs, size) in sorted(
+            self.stats.items(), key=lambda item: -item[1][1]
+        ):
+            rows.append(
+                f"{name:<24} {count:>8} {secs * 1000:>8.1f}ms {secs / total * 100:>5.1f}%"
+                f" {size if size else '':>12}"
+            )
+        rows.append(f"{'total':<24} {'':>8} {total * 1000:>8.1f}ms")
+        return "\n".join(rows)
+
+
+class _Profiling(threading.local):
+    """Profile active in each thread, if any"""
+
+    profile = None
+
+
+_profiling = _Profiling()
+
 
 class Style:
     """Unified and modifiable style for a document"""
@@ -423,6 +1258,7 @@ class Style:
         body_lines: float,
         heading_bold: bool,
         heading_blue: bool,
+        code_theme: str | None = None,
         # TODO: numbered headings
     ) -> None:
         self.font_heading = font_heading
@@ -433,6 +1269,7 @@ class Style:
         self.body_lines = body_lines
         self.heading_bold = heading_bold
         self.heading_blue = heading_blue
+        self.code_theme = code_theme
 
     @staticmethod
     def andy():
@@ -454,169 +1291,42 @@ class Style:
     def _body_alignment(self) -> int:
         return 3 if self.body_justified else 0
 
+    def _key(self) -> tuple:
+        """Gets key which is the same for styles with all the same settings"""
+        return tuple(sorted(vars(self).items()))
 
-class Document:
-    """High-level document abstractions for conversion"""
-
-    def __init__(self, md: str, path: Path, style: Style = Style.andy()):
-        # Components
-        self.elements = []
-        self.title = None
-        self.subtitle = None
-        self.ctx = Context(path.parent)
-        self.style = style
-
-        # Remove toc and clear up lines
-        lines_raw = _rm_toc(md)
-        lines = []
-        for line in lines_raw:
-            lines.append(line.rstrip())
-
-        # Metadata
-        if len(lines) > 1 and lines[0] == "---":
-            # Go over lines in metadata
-            skip = 0
-            for ind, line in enumerate(lines[1:]):
-                # Stop metadata if it's ended
-                if line == "---":
-                    skip = ind + 1
-                    break
-                # Split at `:` token
-                splitted = line.split(":", 1)
-                # Go to next line if its invalid
-                if len(splitted) != 2:
-                    continue
-                # Clean left and right sections
-                left = splitted[0].lstrip().lower()
-                right = splitted[1].lstrip()
-                # Match left section
-                if left == "title":
-                    self.title = right
-                elif left == "subtitle":
-                    self.subtitle = right
-            # Skip to end of metadata if there was an open and close tag
-            if skip != 0:
-                lines = lines[1 + skip :]
-
-        # Parse through lines
-        while self.ctx.line < len(lines):
-            # Get line
-            line = lines[self.ctx.line]
-            stripped = line.lstrip()
-            # Check start
-            if stripped.startswith("<!--"):
-                # Comment
-                self.ctx.next_line()
-                continue
-            if stripped.startswith("#"):
-                # Heading
-                heading = Heading._md(stripped)
-                self.elements.append(heading)
-                self.ctx.heading = heading
-            elif stripped.startswith("```"):
-                # Codeblock
-                codeblock, skip = Codeblock._md(lines[self.ctx.line :])
-                self.ctx.line += skip
-                self.elements.append(codeblock)
-            elif stripped.startswith(">"):
-                # Quote
-                self.elements.append(Quote._md(copy(self.ctx), line))
-            elif stripped.startswith("-"):
-                # Bullet point
-                self.elements.append(PointBullet._md(copy(self.ctx), line))
-            elif match := re.search(
-                r"^!\[.*\]\(.+\)",
-                line,
-            ):
-                # Image
-                self.elements.append(Image._md(self.ctx, match.group(0)))
-            # Check others
-            else:
-                # Numbered point
-                try:
-                    if "." not in stripped:
-                        raise Exception()  # TODO: better error
-                    int(stripped.split(".", 1)[0])
-                    self.elements.append(PointNumbered._md(copy(self.ctx), line))
-                # Paragraph
-                except:
-                    if (
-                        # Non-sensitive typical empty lines
-                        (not self.ctx.no_spacing() and line == "")
-                        # Sensitive but last line was title
-                        or (
-                            self.ctx.no_spacing()
-                            and lines[self.ctx.line - 1].lstrip().startswith("#")
-                        )
-                        # Sensitive but next line is title
-                        or (
-                            self.ctx.no_spacing()
-                            and len(lines) > self.ctx.line + 1
-                            and lines[self.ctx.line + 1].lstrip().startswith("#")
-                        )
-                    ):
-                        # Skip empty line
-                        self.ctx.next_line()
-                        continue
-                    self.elements.append(Paragraph._md(copy(self.ctx), stripped))
-
-            # Move to next line
-            self.ctx.next_line()
-
-    def save(self, path: Path):
-        """Saves document to `path` provided"""
-        # Create docx file
-        docx_doc = docx.Document()
+    def _docx(self, docx_doc: docx.Document):
+        from docx.enum.style import WD_STYLE_TYPE
+        from docx.shared import RGBColor, Pt
 
         # New styles
         style_codeblock = docx_doc.styles.add_style(STYLE_CODE, WD_STYLE_TYPE.PARAGRAPH)
-
-        # Add title/subtitle
-        if self.title or self.subtitle:
-            # Create empty lines before title
-            for _ in range(4):
-                para = Paragraph(copy(self.ctx), [Run(copy(self.ctx), "")])
-                para._docx(docx_doc)
-
-            # Add title
-            if self.title:
-                docx_para = docx_doc.add_heading(self.title, 0)
-            # Add subtitle
-            if self.subtitle:
-                docx_para = Paragraph(
-                    copy(self.ctx), [Run(copy(self.ctx), self.subtitle)]
-                )._docx(docx_doc)
-                docx_para.style = "Subtitle"
-
-            # Page break
-            docx_para = docx_doc.add_paragraph()
-            docx_run = docx_para.add_run()
-            docx_run.add_break(WD_BREAK.PAGE)
-
-        # Add elements
-        for element in self.elements:
-            element._docx(docx_doc)
+        style_link = docx_doc.styles.add_style(STYLE_LINK, WD_STYLE_TYPE.CHARACTER)
+        styles_toc = [
+            docx_doc.styles.add_style(f"toc {level}", WD_STYLE_TYPE.PARAGRAPH)
+            for level in range(1, Toc.MAX_LEVEL + 1)
+        ]
 
         # Replace all fonts with body font by default
         for style in docx_doc.styles:
             if hasattr(style, "font"):
-                style.font.name = self.style.font_body
+                style.font.name = self.font_body
 
         # Styling for title
         style_title = docx_doc.styles["Title"]
         _style_title_border(style_title)
-        style_title.font.name = self.style.font_heading
+        style_title.font.name = self.font_heading
         style_title.font.size = Pt(26)
-        if not self.style.heading_blue:
+        if not self.heading_blue:
             style_title.font.color.rgb = RGBColor(0x00, 0x00, 0x00)
         style_title.paragraph_format.space_after = Pt(3)
         style_title.paragraph_format.alignment = 1
 
         # Styling for subtitle
         style_subtitle = docx_doc.styles["Subtitle"]
-        style_subtitle.font.name = self.style.font_heading
+        style_subtitle.font.name = self.font_heading
         style_subtitle.font.size = Pt(14)
-        if not self.style.heading_blue:
+        if not self.heading_blue:
             style_subtitle.font.color.rgb = RGBColor(0x00, 0x00, 0x00)
         style_subtitle.font.italic = False
         style_subtitle.paragraph_format.alignment = 1
@@ -624,9 +1334,9 @@ class Document:
         # Styling for headings
         for h in range(1, 9):
             style_heading = docx_doc.styles[f"Heading {h}"]
-            style_heading.font.name = self.style.font_heading
-            style_heading.font.bold = self.style.heading_bold
-            if not self.style.heading_blue:
+            style_heading.font.name = self.font_heading
+            style_heading.font.bold = self.heading_bold
+            if not self.heading_blue:
                 style_heading.font.color.rgb = RGBColor(0x00, 0x00, 0x00)
 
             # Per-level styling
@@ -643,125 +1353,1962 @@ class Document:
 
         # Styling for paragraphs
         style_paragraph = docx_doc.styles["Normal"]
-        style_paragraph.font.size = Pt(self.style.body_pt)
-        style_paragraph.paragraph_format.alignment = self.style._body_alignment()
-        style_paragraph.paragraph_format.line_spacing = self.style.body_lines
+        style_paragraph.font.size = Pt(self.body_pt)
+        style_paragraph.paragraph_format.alignment = self._body_alignment()
+        style_paragraph.paragraph_format.line_spacing = self.body_lines
 
         # Styling for captions
-        if not self.style.heading_blue:
+        if not self.heading_blue:
             style_caption = docx_doc.styles["Caption"]
             style_caption.font.color.rgb = RGBColor(0x00, 0x00, 0x00)
 
         # Styling for codeblocks
-        style_codeblock.font.name = self.style.font_code
+        style_codeblock.font.name = self.font_code
         style_codeblock.paragraph_format.space_after = Pt(0)
         style_codeblock.paragraph_format.line_spacing = 1
         style_codeblock.paragraph_format.alignment = 0
 
-        # TODO: new "Link" run styling, can be done
+        # Styling for links
+        style_link.font.underline = True
+        if self.heading_blue:
+            style_link.font.color.rgb = RGBColor(0x05, 0x63, 0xC1)
 
-        # Use docx's vanilla save
-        docx_doc.save(path)
+        # Styling for table of contents entries, as Word's own built-in styles
+        for level, style_toc in enumerate(styles_toc):
+            style_toc.element.customStyle = None
+            style_toc.style_id = f"TOC{level + 1}"
+            style_toc.base_style = docx_doc.styles["Normal"]
+            style_toc.paragraph_format.left_indent = Pt(11 * level)
+            style_toc.paragraph_format.space_after = Pt(5)
 
 
-def _style_title_border(style_title):
-    """Removes border style on title which is set by python-docx by default.
-    This is a hack because there's no programmatic way to do this as of writing"""
-    el = style_title._element
-    el.remove(el.xpath("w:pPr")[0])
+class Block:
+    """Block of markdown lines found by `scan`, with any blocks inside of it as children"""
 
+    __slots__ = ("kind", "line", "lines", "children")
 
-def _level_info(line: str) -> tuple:
-    """Figures out level information and returns it and the line without spacing"""
-    stripped = line.lstrip()
-    num = len(line) - len(stripped)
-    level = int(num / 2)
-    return (level, stripped)
+    def __init__(self, kind: str, line: int, lines: list) -> None:
+        self.kind = kind
+        self.line = line
+        self.lines = lines
+        self.children = []
 
+    @property
+    def level(self) -> int:
+        """Level of heading blocks, or indentation level of anything else"""
+        if self.kind == BLOCK_HEADING:
+            stripped = self.lines[0].lstrip()
+            return len(stripped) - len(stripped.lstrip("#"))
+        return _level_info(self.lines[0])[0] if self.lines else 0
 
-def _err_exit(msg: str):
-    """Prints error message to console and exits program, used for command-line"""
-    print(f"{CLI_HELP}\n\nError: {msg}", file=sys.stderr)
-    sys.exit(1)
 
+def scan(lines: Iterable[str], start: int = 0) -> Iterable[Block]:
+    """Scans cleaned up markdown lines into a flat stream of classified blocks, each on one
+    line apart from codeblocks which go through to their closing fence and tables which go
+    through all of their rows"""
+    if not isinstance(lines, _Lines):
+        lines = _Lines(lines)
+    for line in lines:
+        # Classify by how the line starts
+        stripped = line.lstrip()
+        match = _BLOCK_START.match(stripped)
+        if match is not None:
+            kind = _BLOCK_KINDS[match.lastindex]
+            # Images have to be at the very start of the line
+            if kind == BLOCK_IMAGE and len(stripped) != len(line):
+                kind = BLOCK_PARAGRAPH
+        else:
+            kind = BLOCK_BLANK if line == "" else BLOCK_PARAGRAPH
+        block = Block(kind, start, [line])
 
-def _rm_toc(md: str) -> list:
-    """Removes first table of contents section from a markdown string, returning list of lines"""
-    # Don't check if there isn't one
-    check = md.lower()
-    if "table of contents" not in check and "contents" not in check:
-        return md.splitlines()
-    # Parse through
-    in_toc = False
-    removed_toc = False
-    keep = []
-    for line in md.splitlines():
-        clean = line.lstrip()
-        # Title, so either start/end toc removal
-        if clean.startswith("#") and not removed_toc:
-            # Stop removing toc
-            if in_toc:
-                in_toc = False
-                keep.append(line)
-                continue
-            # Start removing toc
-            title = clean.lstrip("#").strip().lower()
-            if title in ["table of contents", "contents"]:
-                in_toc = True
+        # Read codeblocks through to their closing fence
+        if kind == BLOCK_CODEBLOCK:
+            for line in lines:
+                block.lines.append(line)
+                if line.lstrip() == "```":
+                    break
+        # Read tables through their rows if there's a delimiter row under the header
+        elif kind == BLOCK_TABLE:
+            delimiter = lines.peek()
+            if (
+                delimiter is not None
+                and _TABLE_DELIMITER.fullmatch(delimiter.strip())
+                and len(_table_cells(delimiter)) == len(_table_cells(line))
+            ):
+                block.lines.append(next(lines))
+                while (peek := lines.peek()) is not None and peek.lstrip().startswith(
+                    "|"
+                ):
+                    block.lines.append(next(lines))
             else:
-                keep.append(line)
-        # Add like normal
-        elif not in_toc:
-            keep.append(line)
-    return keep
-
+                block.kind = BLOCK_PARAGRAPH
+        start += len(block.lines)
+        yield block
 
-def _add_link(
-    paragraph: docx.text.paragraph.Paragraph, link: str, text: str, external: bool
-):
-    """Places an internal or external link within a paragraph object"""
 
-    # Create the w:hyperlink tag
-    hyperlink = docx.oxml.shared.OxmlElement("w:hyperlink")
-    # Set where it links to
-    if external:
-        # This gets access to the document.xml.rels file and gets a new relation id value
-        part = paragraph.part
-        r_id = part.relate_to(
-            link, docx.opc.constants.RELATIONSHIP_TYPE.HYPERLINK, is_external=True
-        )
-        # External relationship value
-        hyperlink.set(docx.oxml.shared.qn("r:id"), r_id)
+def tree(md: str) -> Block:
+    """Parses markdown into a tree of blocks, with blocks nested under the heading of the
+    section they're in and any front matter as the first block"""
+    root = Block(BLOCK_DOCUMENT, 0, [])
+    lines = _Lines(_rm_toc(md.splitlines()))
+    metadata, closed = _front_matter(lines)
+    if closed:
+        root.children.append(Block(BLOCK_METADATA, 0, metadata))
     else:
-        # Internal anchor value
-        hyperlink.set(docx.oxml.shared.qn("w:anchor"), link)
-    # Create a w:r element
-    new_run = docx.oxml.shared.OxmlElement("w:r")
-    # Create a new w:rPr element
-    run_prop = docx.oxml.shared.OxmlElement("w:rPr")
-    # Add link styling
-    run_style = docx.oxml.shared.OxmlElement("w:pStyle")
-    run_style.set(docx.oxml.shared.qn("w:val"), "Link")
-    run_prop.append(run_style)
-    # Join all the xml elements together add add the required text to the w:r element
-    new_run.append(run_prop)
-    new_run.text = text
-    hyperlink.append(new_run)
-    # Add to paragraph
-    paragraph._p.append(hyperlink)
-    return hyperlink
+        metadata = []
 
+    # Nest blocks under headings, closing headings of the same level or deeper
+    parents = [root]
+    for block in scan(lines, len(metadata)):
+        if block.kind == BLOCK_HEADING:
+            while len(parents) > 1 and parents[-1].level >= block.level:
+                parents.pop()
+            parents[-1].children.append(block)
+            parents.append(block)
+        else:
+            parents[-1].children.append(block)
+    return root
 
-def _is_bib(text: str) -> bool:
-    """Checks if provided heading text is referencing a bibliography"""
-    return text.lower() in ["bibliography", "references"]
 
+class Document:
+    """High-level document abstractions for conversion. Huge documents can be parsed
+    across `jobs` processes, `None` being one per cpu, in chunks of at least
+    `CHUNK_LINES` lines split before headings; the result is the same as parsing serially.
+    Documents of fewer than `MIN_CHUNKS` chunks, or with only one cpu, are parsed here
+    """
 
-def _run_ib(ctx: Context, line: str) -> int:
-    """Run parsing for italics and bold"""
+    CHUNK_LINES = 20000
+    MIN_CHUNKS = 4
+
+    def __init__(
+        self,
+        md: str,
+        path: Path,
+        style: Style = Style.andy(),
+        jobs: int | None = 1,
+        appendix: bool = True,
+    ):
+        self._parse(md.splitlines(), path, style, jobs, appendix)
+
+    @classmethod
+    def from_stream(
+        cls,
+        stream: Iterable[str],
+        path: Path,
+        style: Style = Style.andy(),
+        jobs: int | None = 1,
+        appendix: bool = True,
+    ):
+        """Creates document from a file object or iterator of lines, parsing it line by line
+        so only the block currently being parsed is held in memory, or only the chunks
+        being parsed if across processes. Local files in the markdown file's directory
+        which are linked to are shown in an appendix unless `appendix` is off"""
+        doc = cls.__new__(cls)
+        doc._parse(stream, path, style, jobs, appendix)
+        return doc
+
+    def _parse(
+        self,
+        stream: Iterable[str],
+        path: Path,
+        style: Style,
+        jobs: int | None = 1,
+        appendix: bool = True,
+        check_links: bool = True,
+    ):
+        self._start(path, style, appendix)
+        # Remove toc and clear up lines
+        stream = _rm_toc(stream)
+        if _profiling.profile is not None:
+            stream = _profiling.profile.iter("toc", stream)
+        lines = _Lines(stream)
+        self._metadata(lines)
+        if jobs == 1 or (os.cpu_count() or 1) < 2:
+            self._parse_lines(lines)
+        else:
+            self._parse_chunks(lines, path, jobs or os.cpu_count())
+        self._add_appendix()
+        if check_links:
+            self._check_links(path)
+
+    def _start(self, path: Path, style: Style, appendix: bool = True):
+        # Components
+        self.elements = []
+        self.title = None
+        self.subtitle = None
+        self.ctx = Context(path.parent)
+        self.ctx.appendix.enabled = appendix
+        self.style = style
+        # Headings by the slug they're bookmarked with, how many of each slug so far and
+        # the names of their bookmarks
+        self.anchors = {}
+        self._slugs = {}
+        self._bookmarks = set()
+
+    def _metadata(self, lines: "_Lines"):
+        # Go over lines in metadata, even if it turns out not to be closed
+        metadata, closed = _front_matter(lines)
+        for line in metadata[1 : -1 if closed else None]:
+            # Split at `:` token
+            splitted = line.split(":", 1)
+            # Go to next line if its invalid
+            if len(splitted) != 2:
+                continue
+            # Clean left and right sections
+            left = splitted[0].lstrip().lower()
+            right = splitted[1].lstrip()
+            # Match left section
+            if left == "title":
+                self.title = right
+            elif left == "subtitle":
+                self.subtitle = right
+
+    def _parse_lines(self, lines: "_Lines"):
+        # Parse through scanned blocks, timing each if profiling
+        profile = _profiling.profile
+        if profile is None:
+            parse_block = self._parse_block
+            for block in scan(lines):
+                parse_block(block, lines)
+            return
+        for block in profile.iter("scan", scan(lines)):
+            profile.start()
+            self._parse_block(block, lines)
+            profile.stop(f"parse {block.kind}")
+
+    def _parse_chunks(self, lines: "_Lines", path: Path, jobs: int):
+        """Parses chunks of lines across processes, carrying figure numbers, slugs and the
+        rest of what parsing carries on from line to line over from chunk to chunk"""
+        # Parse here if there's too few chunks for starting processes to pay off
+        chunks = _chunks(lines, self.CHUNK_LINES)
+        first = list(itertools.islice(chunks, self.MIN_CHUNKS))
+        if len(first) < self.MIN_CHUNKS:
+            for chunk, after in first:
+                self._parse_lines(_Lines(chunk, after))
+            return
+
+        # Collecting while unpickling millions of runs makes it several times slower, as
+        # every object made sets off a collection over the elements merged so far
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._merge_chunks(first, chunks, path, jobs)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def _merge_chunks(self, first: list, chunks: Iterable, path: Path, jobs: int):
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(jobs) as pool:
+            parsed = pool.map(
+                _parse_chunk,
+                itertools.chain(first, chunks),
+                itertools.repeat(path),
+                itertools.repeat(self.style),
+                itertools.repeat(self.ctx.appendix.enabled),
+            )
+            for elements, figures, line, links, files, missing in parsed:
+                # Merge elements, numbering them on from the chunks before
+                for element in elements:
+                    if isinstance(element, Heading):
+                        self._add_anchor(element)
+                        self.ctx.heading = element
+                    elif isinstance(element, Toc):
+                        element.anchors = self.anchors
+                    elif isinstance(element, Image) and element.caption is not None:
+                        element = _renumbered(element, self.ctx.figures)
+                    self.elements.append(element)
+                self.ctx.figures += figures
+                self.ctx.line += line
+                self.ctx.links.extend(links)
+                # Link local files here, where they're read
+                for link in files:
+                    self.ctx.appendix_link(link)
+                self.ctx.appendix.missing.extend(missing)
+
+    def _parse_block(self, block: Block, lines: "_Lines"):
+        kind = block.kind
+        line = block.lines[0]
+        # Check kind
+        if kind == BLOCK_COMMENT:
+            # Comment
+            self.ctx.next_line()
+            return
+        if kind == BLOCK_HEADING:
+            # Heading
+            heading = Heading._md(line.lstrip())
+            self._add_anchor(heading)
+            self.elements.append(heading)
+            self.ctx.heading = heading
+        elif kind == BLOCK_CODEBLOCK:
+            # Codeblock
+            self.elements.append(
+                Codeblock._md(block.lines, lines.peek(), self.style.code_theme)
+            )
+            self.ctx.line += len(block.lines) - 1
+        elif kind == BLOCK_TABLE:
+            # Table
+            self.elements.append(Table._md(self.ctx, block.lines))
+            self.ctx.line += len(block.lines) - 1
+        elif kind == BLOCK_QUOTE:
+            # Quote
+            self.elements.append(Quote._md(self.ctx, line))
+        elif kind == BLOCK_BULLET:
+            # Bullet point
+            self.elements.append(PointBullet._md(self.ctx, line))
+        elif kind == BLOCK_IMAGE:
+            # Image
+            matched = _IMAGE.match(line).group(0)
+            self.elements.append(Image._md(self.ctx, matched))
+        elif kind == BLOCK_NUMBERED:
+            # Numbered point
+            self.elements.append(PointNumbered._md(self.ctx, line))
+        elif kind == BLOCK_TOC:
+            # Table of contents, listing headings from the anchors once they're all parsed
+            self.elements.append(Toc._md(line, self.anchors))
+        # Paragraph
+        else:
+            if (
+                # Non-sensitive typical empty lines
+                (not self.ctx.no_spacing() and kind == BLOCK_BLANK)
+                # Sensitive but last line was title
+                or (
+                    self.ctx.no_spacing()
+                    and lines.prev is not None
+                    and lines.prev.lstrip().startswith("#")
+                )
+                # Sensitive but next line is title
+                or (
+                    self.ctx.no_spacing()
+                    and lines.peek() is not None
+                    and lines.peek().lstrip().startswith("#")
+                )
+            ):
+                # Skip empty line
+                self.ctx.next_line()
+                return
+            self.elements.append(Paragraph._md(self.ctx, line.lstrip()))
+
+        # Move to next line
+        self.ctx.next_line()
+
+    def _add_anchor(self, heading: Heading):
+        """Gives heading a slug unique in the document and indexes it, unless it has no text
+        to make a slug out of"""
+        slug = _slug(heading.text)
+        if slug != "":
+            heading.slug = self._unique_slug(slug)
+            self.anchors[heading.slug] = heading
+
+    def _unique_slug(self, slug: str) -> str:
+        """Gets slug numbered like `slug-1`, `slug-2` and so on if it or the name of the
+        bookmark it's shortened to is already taken"""
+        num = self._slugs.get(slug, 0)
+        unique = slug if num == 0 else f"{slug}-{num}"
+        while unique in self.anchors or _bookmark_name(unique) in self._bookmarks:
+            num += 1
+            unique = f"{slug}-{num}"
+        self._slugs[slug] = num + 1
+        self._bookmarks.add(_bookmark_name(unique))
+        return unique
+
+    def _add_appendix(self) -> list:
+        """Adds appendix of linked local files once they're read, getting its elements"""
+        elements = self.ctx.appendix.elements(self.style.code_theme)
+        if elements:
+            self.ctx.appendix.start = len(self.elements)
+        for element in elements:
+            if isinstance(element, Heading):
+                if element.slug is None:
+                    self._add_anchor(element)
+                else:
+                    self.anchors[element.slug] = element
+            self.elements.append(element)
+        return elements
+
+    def _check_links(self, path: Path):
+        """Warns once about internal links to headings which aren't in the document"""
+        links = (
+            f"#{anchor}" for anchor in self.ctx.links if anchor not in self.anchors
+        )
+        _warn_links(links, f"'{path}'")
+
+    def save(
+        self, path: Path, streaming: bool = False, images: ImageCache | None = None
+    ):
+        """Saves document to `path` provided, optionally streaming the docx xml straight
+        into the file instead of building up a python-docx document first. Images can be
+        shared between saves by passing the same `images` cache to each"""
+        self._save(path, streaming, images, self.elements)
+
+    def _save(
+        self,
+        path: Path,
+        streaming: bool,
+        images: ImageCache | None,
+        elements: Iterable,
+    ):
+        # Get images for this save
+        profile = _profiling.profile
+        if profile is not None:
+            profile.start()
+        if images is None:
+            images = ImageCache()
+        images.prefetch(
+            element.link for element in self.elements if isinstance(element, Image)
+        )
+        if profile is not None:
+            profile.stop("images prefetch")
+            profile.start()
+        template = _Template.of(self.style)
+        if profile is not None:
+            profile.stop("template")
+
+        # Stream xml directly if wanted
+        if streaming:
+            with _Writer(path, template, images) as writer:
+                self._xml(writer, elements)
+            return
+
+        # Create docx file from styled template
+        if profile is not None:
+            profile.start()
+        docx_doc = template.docx()
+        _Embeds(docx_doc.part, images)
+        if profile is not None:
+            profile.stop("template")
+
+        # Add title/subtitle
+        if self.title or self.subtitle:
+            # Create empty lines before title
+            for _ in range(4):
+                para = Paragraph(self.ctx, [Run(self.ctx, "")])
+                para._docx(docx_doc)
+
+            # Add title
+            if self.title:
+                docx_para = docx_doc.add_heading(self.title, 0)
+            # Add subtitle
+            if self.subtitle:
+                docx_para = Paragraph(self.ctx, [Run(self.ctx, self.subtitle)])._docx(
+                    docx_doc
+                )
+                docx_para.style = "Subtitle"
+
+            # Page break
+            from docx.enum.text import WD_BREAK
+
+            docx_para = docx_doc.add_paragraph()
+            docx_run = docx_para.add_run()
+            docx_run.add_break(WD_BREAK.PAGE)
+
+        # Add elements, timing each if profiling
+        if profile is None:
+            for element in elements:
+                element._docx(docx_doc)
+        else:
+            for element in elements:
+                profile.start()
+                element._docx(docx_doc)
+                profile.stop(f"render {type(element).__name__}")
+
+        # Use docx's vanilla save
+        if profile is not None:
+            profile.start()
+        docx_doc.save(path)
+        if profile is not None:
+            profile.stop("zip", _saved_size(path))
+
+    def _xml(self, writer: "_Writer", elements: Iterable):
+        self._xml_title(writer)
+
+        # Add elements, timing each if profiling
+        profile = _profiling.profile
+        if profile is None:
+            for element in elements:
+                element._xml(writer)
+            return
+        for element in elements:
+            profile.start()
+            element._xml(writer)
+            profile.stop(f"render {type(element).__name__}")
+
+    def _xml_title(self, writer: "_Writer"):
+        # Add title/subtitle
+        if self.title or self.subtitle:
+            # Create empty lines before title
+            for _ in range(4):
+                para = Paragraph(self.ctx, [Run(self.ctx, "")])
+                para._xml(writer)
+
+            # Add title
+            if self.title:
+                writer.paragraph(_xml_run(self.title), "Title")
+            # Add subtitle
+            if self.subtitle:
+                Paragraph(self.ctx, [Run(self.ctx, self.subtitle)])._xml(
+                    writer, "Subtitle"
+                )
+
+            # Page break
+            writer.page_break()
+
+
+class Bookmark:
+    """Named place in the document which internal links can point to"""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def _docx(self, docx_doc: docx.Document):
+        # Add between paragraphs, before the section properties
+        body = docx_doc.element.body
+        start, end = _Embeds.of(docx_doc.part).bookmark(self.name)
+        body.sectPr.addprevious(start)
+        body.sectPr.addprevious(end)
+
+    def _xml(self, writer: "_Writer"):
+        writer.bookmark(self.name)
+
+
+class Book:
+    """Markdown chapter files assembled into one document, each parsed on its own from its
+    own directory so relative links keep working. Figures are numbered on from chapter to
+    chapter, headings get slugs unique across the book and links to another chapter's
+    file, optionally with an `#anchor`, point inside of the book. Parsed chapters are kept
+    until their file changes, with changed chapters parsed across `jobs` processes if
+    there's more than one"""
+
+    def __init__(
+        self,
+        paths: Iterable[Path],
+        style: Style = Style.andy(),
+        title: str | None = None,
+        subtitle: str | None = None,
+        jobs: int | None = None,
+        appendix: bool = True,
+    ) -> None:
+        self.paths = [Path(path) for path in paths]
+        self.style = style
+        self.title = title
+        self.subtitle = subtitle
+        self.jobs = jobs
+        self.appendix = appendix
+        self._chapters = {}
+
+    @classmethod
+    def from_manifest(
+        cls,
+        path: Path,
+        style: Style = Style.andy(),
+        jobs: int | None = None,
+        appendix: bool = True,
+    ) -> "Book":
+        """Creates book from a manifest file listing one chapter path per line relative to
+        it, optionally as bullet points, with the title and subtitle in its front matter
+        """
+        path = Path(path)
+        with open(path, "r") as file:
+            lines = _Lines(file)
+            metadata, closed = _front_matter(lines)
+            paths = []
+            for line in lines:
+                line = line.strip()
+                if line.startswith("- "):
+                    line = line[2:].lstrip()
+                if line != "":
+                    paths.append(path.parent / line)
+
+        # Get title and subtitle the same way documents do
+        meta = Document.__new__(Document)
+        meta._start(path, style)
+        meta._metadata(_Lines(metadata if closed else []))
+        return cls(paths, style, meta.title, meta.subtitle, jobs, appendix)
+
+    def document(self) -> Document:
+        """Gets document of every chapter, only parsing chapters which have changed"""
+        self._parse()
+
+        # Start document of the whole book
+        doc = Document.__new__(Document)
+        doc._start(self.paths[0] if self.paths else Path("book.md"), self.style)
+        doc.title = self.title
+        doc.subtitle = self.subtitle
+
+        # Index every chapter's headings, renaming copies of those whose slug is taken, and
+        # merge their appendices into one for the book without reading files again
+        chapters = {}
+        for ind, path in enumerate(self.paths):
+            chapter = self._chapters[path.resolve()][1]
+            body = chapter.elements[: chapter.ctx.appendix.start]
+            appendix = {id(element) for element in chapter.elements[len(body) :]}
+            renames = {}
+            for slug, heading in chapter.anchors.items():
+                if id(heading) in appendix:
+                    continue
+                unique = doc._unique_slug(slug)
+                if unique != slug:
+                    heading = copy(heading)
+                    heading.slug = unique
+                    renames[slug] = unique
+                doc.anchors[unique] = heading
+            for file, (_, name, read) in chapter.ctx.appendix.files.items():
+                doc.ctx.appendix.add(file, name, read)
+            chapters[path.resolve()] = (f"chapter_{ind + 1}", chapter, renames, body)
+
+        # Add each chapter after a bookmark for it, noting links to headings which aren't
+        # in the chapter or anywhere else in the book and to other chapters which match no
+        # heading in them
+        missing = []
+        for path in self.paths:
+            bookmark, chapter, renames, body = chapters[path.resolve()]
+            missing.extend(
+                f"#{anchor}"
+                for anchor in chapter.ctx.links
+                if anchor not in chapter.anchors and anchor not in doc.anchors
+            )
+            doc.elements.append(Bookmark(bookmark))
+            for element in body:
+                if isinstance(element, Heading):
+                    if element.slug in renames:
+                        element = doc.anchors[renames[element.slug]]
+                elif isinstance(element, Toc):
+                    element = Toc(element.title, doc.anchors)
+                elif isinstance(element, Image) and element.caption is not None:
+                    element = _renumbered(element, doc.ctx.figures)
+                elif isinstance(element, Paragraph):
+                    element = self._linked(
+                        element, chapter.ctx.wd, chapters, renames, missing
+                    )
+                elif isinstance(element, Table):
+                    element = copy(element)
+                    element.header, *element.rows = [
+                        [
+                            self._linked(
+                                para, chapter.ctx.wd, chapters, renames, missing
+                            )
+                            for para in row
+                        ]
+                        for row in [element.header, *element.rows]
+                    ]
+                doc.elements.append(element)
+            doc.ctx.figures += chapter.ctx.figures
+        _warn_links(missing, "chapters of the book")
+        doc._add_appendix()
+        return doc
+
+    def save(
+        self, path: Path, streaming: bool = False, images: ImageCache | None = None
+    ):
+        """Saves book to `path` provided, see `Document.save` for more info"""
+        self.document().save(path, streaming, images)
+
+    def _parse(self):
+        """Parses chapters which are new or have changed on disk since they were parsed"""
+        # Get chapters which need parsing
+        missing = []
+        for path in self.paths:
+            cached = self._chapters.get(path.resolve())
+            key = _file_key(path)
+            if key is None:
+                raise Exception(f"Chapter file '{path}' doesn't exist")
+            if cached is None or cached[0] != key:
+                missing.append((path, key))
+
+        # Parse them, across processes if it's worth it
+        if len(missing) > 1 and self.jobs != 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            jobs = min(len(missing), self.jobs or os.cpu_count())
+            with ProcessPoolExecutor(jobs) as pool:
+                paths = [path for path, _ in missing]
+                docs = list(
+                    pool.map(
+                        _book_chapter,
+                        paths,
+                        itertools.repeat(self.style),
+                        itertools.repeat(self.appendix),
+                    )
+                )
+        else:
+            docs = [
+                _book_chapter(path, self.style, self.appendix) for path, _ in missing
+            ]
+        for (path, key), doc in zip(missing, docs):
+            self._chapters[path.resolve()] = (key, doc)
+
+    def _linked(
+        self, para: Paragraph, wd: Path, chapters: dict, renames: dict, missing: list
+    ) -> Paragraph:
+        """Gets paragraph with links to chapters pointing inside the book and internal links
+        following `renames` of headings, only copying it if there's any. Links to headings
+        which aren't in the chapter are added to `missing`"""
+        runs = None
+        for ind, run in enumerate(para.runs):
+            if run.link is None:
+                continue
+            # Follow renamed heading within this chapter
+            if not run.link_external:
+                if run.link not in renames:
+                    continue
+                link = renames[run.link]
+            # Get chapter linked to otherwise
+            else:
+                file, _, anchor = run.link.partition("#")
+                if file == "" or ":" in file:
+                    continue
+                chapter = chapters.get((wd / file).resolve())
+                if chapter is None:
+                    continue
+                # Point it at the heading or start of the chapter
+                bookmark, doc, target_renames, _ = chapter
+                if anchor in target_renames:
+                    link = target_renames[anchor]
+                elif anchor in doc.anchors:
+                    link = anchor
+                else:
+                    if anchor != "":
+                        missing.append(f"{(wd / file).resolve()}#{anchor}")
+                    link = bookmark
+            if runs is None:
+                runs = list(para.runs)
+            run = copy(run)
+            run.link = link
+            run.link_external = False
+            runs[ind] = run
+        if runs is None:
+            return para
+        para = copy(para)
+        para.runs = runs
+        return para
+
+
+def _renumbered(image: Image, figures: int) -> Image:
+    """Gets copy of a captioned image with its figure number after `figures` more"""
+    if figures == 0:
+        return image
+    first = image.caption.runs[0]
+    num, rest = first.text[len("Figure ") :].split(" ", 1)
+    run = copy(first)
+    run.text = f"Figure {int(num) + figures} {rest}"
+    caption = copy(image.caption)
+    caption.runs = [run, *image.caption.runs[1:]]
+    image = copy(image)
+    image.caption = caption
+    return image
+
+
+def _parse_chunk(chunk: tuple, path: Path, style: Style, appendix: bool) -> tuple:
+    """Parses a chunk of lines and the line after it on its own, getting its elements and
+    what has to be carried over into the chunks after it"""
+    lines, after = chunk
+    doc = Document.__new__(Document)
+    doc._start(path, style, appendix)
+    doc.ctx.appendix.reading = False
+    doc._parse_lines(_Lines(lines, after))
+    ctx = doc.ctx
+    appendix = ctx.appendix
+    return (
+        doc.elements,
+        ctx.figures,
+        ctx.line,
+        ctx.links,
+        appendix.links,
+        appendix.missing,
+    )
+
+
+def _book_chapter(path: Path, style: Style, appendix: bool) -> Document:
+    """Parses a chapter of a book from its file, leaving its links to headings to be
+    checked against the whole book"""
+    doc = Document.__new__(Document)
+    with open(path, "r") as file:
+        doc._parse(file, path, style, appendix=appendix, check_links=False)
+    return doc
 
-    # Get star count
-    stars = len(line) - len(line.lstrip("*"))
+
+class _Template:
+    """Empty document rendered with a style applied, which new documents are cloned from or
+    streamed on top of so styles are only applied once per style"""
+
+    _TEMPLATES = {}
+
+    def __init__(self, style: Style) -> None:
+        # Render empty document with style
+        import docx
+
+        docx_doc = docx.Document()
+        style._docx(docx_doc)
+        self.style_ids = {
+            docx_style.name: docx_style.style_id for docx_style in docx_doc.styles
+        }
+        self.text_width = _text_width(docx_doc)
+        self._docx_doc = deepcopy(docx_doc)
+        buf = BytesIO()
+        docx_doc.save(buf)
+
+        # Read all parts back out of the package
+        with zipfile.ZipFile(buf) as zf:
+            self.parts = {name: zf.read(name) for name in zf.namelist()}
+
+        # Split document around body content
+        document = self.parts["word/document.xml"].decode()
+        ind = document.index("<w:body>") + len("<w:body>")
+        self.document_head = document[:ind]
+        self.document_tail = document[ind:]
+
+    @staticmethod
+    def of(style: Style) -> "_Template":
+        """Gets template for a style, only rendering it the first time it's used"""
+        key = style._key()
+        template = _Template._TEMPLATES.get(key)
+        if template is None:
+            template = _Template(style)
+            _Template._TEMPLATES[key] = template
+        return template
+
+    def docx(self) -> docx.Document:
+        """Gets a new python-docx document with the style applied"""
+        return deepcopy(self._docx_doc)
+
+
+class _Embeds:
+    """Pictures and links embedded into a python-docx document during a save, so each unique
+    image or url gets one relationship and shape ids don't need the whole document searched
+    for every picture"""
+
+    _SAVES = weakref.WeakKeyDictionary()
+    _LINK = None
+
+    def __init__(self, part, images: ImageCache) -> None:
+        self.images = images
+        self._part = part
+        self._rids = {}
+        self._links = {}
+        self._rid_num = 1
+        self._shape_id = 0
+        self._bookmark_id = 0
+        _Embeds._SAVES[part] = self
+
+    @staticmethod
+    def of(part) -> "_Embeds":
+        """Gets embeds for the document part, starting new ones if it's not being saved"""
+        embeds = _Embeds._SAVES.get(part)
+        if embeds is None:
+            embeds = _Embeds(part, ImageCache())
+        return embeds
+
+    def picture(
+        self,
+        docx_run: docx.text.run.Run,
+        image: docx.image.image.Image,
+        width: int = None,
+        height: int = None,
+    ):
+        """Adds picture to the end of a run, embedding each unique image once"""
+        from docx.opc.constants import RELATIONSHIP_TYPE
+        from docx.oxml.shape import CT_Inline
+
+        # Get or add image part
+        rid = self._rids.get(image.sha1)
+        if rid is None:
+            image_part = self._part.package.get_or_add_image_part(BytesIO(image.blob))
+            rid = self._relate(RELATIONSHIP_TYPE.IMAGE, image_part, False)
+            self._rids[image.sha1] = rid
+
+        # Create inline picture
+        cx, cy = image.scaled_dimensions(width, height)
+        self._shape_id += 1
+        inline = CT_Inline.new_pic_inline(self._shape_id, rid, image.filename, cx, cy)
+        docx_run._r.add_drawing(inline)
+
+    def link(
+        self,
+        docx_para: docx.text.paragraph.Paragraph,
+        link: str,
+        text: str,
+        external: bool,
+    ):
+        """Adds link to the end of a paragraph, relating each unique url once"""
+        from docx.oxml import parse_xml
+        from docx.oxml.shared import qn
+
+        # Copy link xml, only parsing it the first time
+        if _Embeds._LINK is None:
+            _Embeds._LINK = parse_xml(
+                f"<w:hyperlink {_W_NAMESPACE}>"
+                f'<w:r><w:rPr><w:rStyle w:val="{STYLE_LINK}"/></w:rPr></w:r>'
+                "</w:hyperlink>"
+            )
+        hyperlink = deepcopy(_Embeds._LINK)
+
+        # Set where it links to
+        if external:
+            rid = self._links.get(link)
+            if rid is None:
+                from docx.opc.constants import RELATIONSHIP_TYPE
+
+                rid = self._relate(RELATIONSHIP_TYPE.HYPERLINK, link, True)
+                self._links[link] = rid
+            hyperlink.set(qn("r:id"), rid)
+        else:
+            hyperlink.set(qn("w:anchor"), _bookmark_name(link))
+
+        # Add text and place in paragraph
+        hyperlink[0].text = text
+        docx_para._p.append(hyperlink)
+        return hyperlink
+
+    def bookmark(self, name: str) -> tuple:
+        """Creates start and end elements of a bookmark, numbering bookmarks in the order
+        they're added so no two share an id"""
+        from docx.oxml.shared import OxmlElement, qn
+
+        num = str(self._bookmark_id)
+        self._bookmark_id += 1
+        start = OxmlElement("w:bookmarkStart")
+        start.set(qn("w:id"), num)
+        start.set(qn("w:name"), _bookmark_name(name))
+        end = OxmlElement("w:bookmarkEnd")
+        end.set(qn("w:id"), num)
+        return (start, end)
+
+    def _relate(self, reltype: str, target, external: bool) -> str:
+        """Adds a new relationship from the document without searching through the ones
+        already there, returning its id"""
+        rels = self._part.rels
+        while f"rId{self._rid_num}" in rels:
+            self._rid_num += 1
+        rid = f"rId{self._rid_num}"
+        rels.add_relationship(reltype, target, rid, external)
+        return rid
+
+
+class _Writer:
+    """Streaming docx writer which emits `word/document.xml` straight into the package zip
+    as elements are visited, instead of building up a python-docx document first. Given a
+    `base` package, its links and media are carried over for xml copied out of it. Files
+    are written beside `path` first and only replace it once they're whole"""
+
+    PART_DOCUMENT = "word/document.xml"
+    PART_RELS = "word/_rels/document.xml.rels"
+    PART_TYPES = "[Content_Types].xml"
+    FLUSH_SIZE = 1 << 16
+
+    def __init__(
+        self,
+        path: Path,
+        template: _Template,
+        images: ImageCache,
+        base: zipfile.ZipFile | None = None,
+    ) -> None:
+        self.images = images
+        self._path = path
+        self._tmp = None
+        if isinstance(path, (str, Path)):
+            path = Path(path)
+            self._tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        self._template = template
+        self._zip = zipfile.ZipFile(self._tmp or path, "w", zipfile.ZIP_DEFLATED)
+        self._document = self._zip.open(self.PART_DOCUMENT, "w", force_zip64=True)
+        self._buf = []
+        self._buf_len = 0
+        self._size = 0
+        # Relationships, images and links already added
+        rels = template.parts[self.PART_RELS].decode()
+        self._rels = []
+        self._rids = set(re.findall(r'Id="(rId\d+)"', rels))
+        self._rid_num = 1
+        self._links = {}
+        self._link_props = (
+            f'<w:rPr><w:rStyle w:val="{template.style_ids[STYLE_LINK]}"/></w:rPr>'
+        )
+        self._images = {}
+        self._media = []
+        self._shape_id = 0
+        self._bookmark_id = 0
+        # Relationships carried over from the base and which of them are still used
+        self._based = set()
+        self._used = set()
+        if base is not None:
+            self._carry(base)
+        # Start document
+        self.write(template.document_head)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Finish package if there wasn't an error, putting it in place of any old file
+        if exc_type is None:
+            try:
+                profile = _profiling.profile
+                if profile is None:
+                    self._finish()
+                else:
+                    profile.start()
+                    self._finish()
+                    profile.stop("zip", _saved_size(self._tmp or self._path))
+            except BaseException:
+                if self._tmp is not None:
+                    self._tmp.unlink(missing_ok=True)
+                raise
+            if self._tmp is not None:
+                os.replace(self._tmp, self._path)
+            return
+        # Clean up half-written package, leaving any old file as it was
+        self._document.close()
+        self._zip.close()
+        if self._tmp is not None:
+            self._tmp.unlink(missing_ok=True)
+
+    def write(self, xml: str):
+        """Writes raw xml to the document body, flushing it into the zip in chunks"""
+        self._buf.append(xml)
+        self._buf_len += len(xml)
+        if self._buf_len >= self.FLUSH_SIZE:
+            self._flush()
+
+    def paragraph(self, content: str, style: str = None, props: str = ""):
+        """Writes a paragraph with some run content and optional style and properties"""
+        if style is not None:
+            props = f'<w:pStyle w:val="{self._template.style_ids[style]}"/>' + props
+        if props:
+            props = f"<w:pPr>{props}</w:pPr>"
+        if not props and not content:
+            self.write("<w:p/>")
+        else:
+            self.write(f"<w:p>{props}{content}</w:p>")
+
+    def page_break(self):
+        """Writes a paragraph containing just a page break"""
+        self.write('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def bookmark(self, name: str):
+        """Writes a bookmark between paragraphs which internal links can point to"""
+        self.write(self.bookmarked(name, ""))
+
+    def bookmarked(self, name: str, content: str) -> str:
+        """Wraps run xml in a bookmark so internal links can point to it, numbering
+        bookmarks in the order they're written so no two share an id"""
+        num = self._bookmark_id
+        self._bookmark_id += 1
+        return (
+            f'<w:bookmarkStart w:id="{num}" w:name="{_xml_attr(_bookmark_name(name))}"/>'
+            f'{content}<w:bookmarkEnd w:id="{num}"/>'
+        )
+
+    def copy(self, xml: bytes):
+        """Writes body xml copied out of the base package, keeping what it links to and
+        numbering its bookmarks on from those already written"""
+        self._used.update(re.findall(rb'r:(?:id|embed)="(rId\d+)"', xml))
+        nums = {}
+
+        def renumber(match: re.Match) -> bytes:
+            num = nums.get(match[2])
+            if num is None:
+                num = nums[match[2]] = str(self._bookmark_id).encode()
+                self._bookmark_id += 1
+            return match[1] + num
+
+        self.write(_XML_BOOKMARK_ID.sub(renumber, xml).decode())
+
+    def mark(self) -> int:
+        """Gets the number of bytes written into the document part so far"""
+        self._flush()
+        return self._size
+
+    def link(self, link: str, text: str, external: bool) -> str:
+        """Gets xml for an internal or external link to be placed within a paragraph"""
+        from docx.opc.constants import RELATIONSHIP_TYPE
+
+        if external:
+            rid = self._links.get(link)
+            if rid is None:
+                rid = self._relate(RELATIONSHIP_TYPE.HYPERLINK, link, True)
+                self._links[link] = rid
+            self._used.add(rid.encode())
+            target = f'r:id="{rid}"'
+        else:
+            target = f'w:anchor="{_xml_attr(_bookmark_name(link))}"'
+        return (
+            f"<w:hyperlink {target}><w:r>{self._link_props}{_xml_text(text)}</w:r>"
+            "</w:hyperlink>"
+        )
+
+    def picture(
+        self,
+        image: docx.image.image.Image,
+        width: int = None,
+        height: int = None,
+    ) -> str:
+        """Gets xml for a run containing a picture, embedding each unique image once as it
+        was read, which is after optimising if there's an optimiser"""
+        from docx.opc.constants import RELATIONSHIP_TYPE
+
+        # Get or add image part
+        rid = self._images.get(image.sha1)
+        if rid is None:
+            partnames = {media[1] for media in self._media}
+            num = len(self._media) + 1
+            while f"media/image{num}.{image.ext}" in partnames:
+                num += 1
+            partname = f"media/image{num}.{image.ext}"
+            rid = self._relate(RELATIONSHIP_TYPE.IMAGE, partname, False)
+            self._images[image.sha1] = rid
+            self._media.append((rid, partname, image.content_type, image.blob))
+        self._used.add(rid.encode())
+
+        # Create inline picture
+        cx, cy = image.scaled_dimensions(width, height)
+        self._shape_id += 1
+        name = _xml_attr(image.filename)
+        return (
+            "<w:r><w:drawing>"
+            '<wp:inline xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+            ' xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<wp:extent cx="{cx}" cy="{cy}"/>'
+            f'<wp:docPr id="{self._shape_id}" name="Picture {self._shape_id}"/>'
+            "<wp:cNvGraphicFramePr>"
+            '<a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+            "<a:graphic>"
+            '<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+            f'<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="{name}"/><pic:cNvPicPr/>'
+            "</pic:nvPicPr>"
+            f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch>'
+            "</pic:blipFill>"
+            f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+            '<a:prstGeom prst="rect"/></pic:spPr></pic:pic>'
+            "</a:graphicData></a:graphic></wp:inline></w:drawing></w:r>"
+        )
+
+    def _relate(self, reltype: str, target: str, external: bool) -> str:
+        """Adds a new relationship from the document, returning its id"""
+        while f"rId{self._rid_num}" in self._rids:
+            self._rid_num += 1
+        rid = f"rId{self._rid_num}"
+        self._rids.add(rid)
+        self._rels.append((rid, reltype, target, external))
+        return rid
+
+    def _carry(self, base: zipfile.ZipFile):
+        """Carries over links and media from the base package so copied xml still works"""
+        from docx.opc.constants import RELATIONSHIP_TYPE
+
+        # Get content types of the base's media
+        types = base.read(self.PART_TYPES).decode()
+        defaults = dict(
+            re.findall(r'<Default Extension="([^"]*)" ContentType="([^"]*)"/>', types)
+        )
+        overrides = dict(
+            re.findall(r'<Override PartName="([^"]*)" ContentType="([^"]*)"/>', types)
+        )
+
+        # Add relationships which aren't part of the template
+        rels = base.read(self.PART_RELS).decode()
+        for rel in re.findall(r"<Relationship [^>]*>", rels):
+            attrs = dict(re.findall(r'(\w+)="([^"]*)"', rel))
+            rid, target = attrs["Id"], _xml_unattr(attrs["Target"])
+            if rid in self._rids:
+                continue
+            if attrs["Type"] == RELATIONSHIP_TYPE.HYPERLINK:
+                self._links[target] = rid
+            elif attrs["Type"] == RELATIONSHIP_TYPE.IMAGE:
+                blob = base.read(f"word/{target}")
+                content_type = overrides.get(f"/word/{target}")
+                if content_type is None:
+                    content_type = defaults[target.rsplit(".", 1)[1]]
+                self._images[hashlib.sha1(blob).hexdigest()] = rid
+                self._media.append((rid, target, content_type, blob))
+            else:
+                continue
+            external = attrs.get("TargetMode") == "External"
+            self._rids.add(rid)
+            self._rels.append((rid, attrs["Type"], target, external))
+            self._based.add(rid)
+
+        # Carry on from the highest picture id
+        ids = re.findall(rb'<wp:docPr id="(\d+)"', base.read(self.PART_DOCUMENT))
+        self._shape_id = max(map(int, ids), default=0)
+
+    def _flush(self):
+        """Flushes buffered xml into the document part"""
+        data = "".join(self._buf).encode()
+        self._document.write(data)
+        self._size += len(data)
+        self._buf = []
+        self._buf_len = 0
+
+    def _finish(self):
+        """Finishes the document part and writes every other part of the package"""
+        from docx.opc.spec import default_content_types
+
+        # Finish document
+        self.write(self._template.document_tail)
+        self._flush()
+        self._document.close()
+
+        # Drop anything carried over from the base which is no longer used
+        unused = {rid for rid in self._based if rid.encode() not in self._used}
+        self._rels = [rel for rel in self._rels if rel[0] not in unused]
+        self._media = [media for media in self._media if media[0] not in unused]
+
+        # Write media
+        for _, partname, _, blob in self._media:
+            self._zip.writestr(f"word/{partname}", blob)
+
+        # Write relationships
+        rels = self._template.parts[self.PART_RELS].decode()
+        ind = rels.rindex("</Relationships>")
+        xml = [rels[:ind]]
+        for rid, reltype, target, external in self._rels:
+            mode = ' TargetMode="External"' if external else ""
+            xml.append(
+                f'<Relationship Id="{rid}" Type="{reltype}" Target="{_xml_attr(target)}"{mode}/>'
+            )
+        xml.append(rels[ind:])
+        self._zip.writestr(self.PART_RELS, "".join(xml))
+
+        # Write content types with any new image types
+        types = self._template.parts[self.PART_TYPES].decode()
+        defaults = dict(
+            re.findall(r'<Default Extension="([^"]*)" ContentType="([^"]*)"/>', types)
+        )
+        overrides = dict(
+            re.findall(r'<Override PartName="([^"]*)" ContentType="([^"]*)"/>', types)
+        )
+        for _, partname, content_type, _ in self._media:
+            ext = partname.rsplit(".", 1)[1]
+            if (ext.lower(), content_type) in default_content_types:
+                defaults[ext] = content_type
+            else:
+                overrides[f"/word/{partname}"] = content_type
+        xml = [types[: types.index(">", types.index("<Types")) + 1]]
+        for ext in sorted(defaults):
+            xml.append(f'<Default Extension="{ext}" ContentType="{defaults[ext]}"/>')
+        for partname in sorted(overrides):
+            xml.append(
+                f'<Override PartName="{partname}" ContentType="{overrides[partname]}"/>'
+            )
+        xml.append("</Types>")
+        self._zip.writestr(self.PART_TYPES, "".join(xml))
+
+        # Copy over the rest of the template
+        for name, data in self._template.parts.items():
+            if name not in (self.PART_DOCUMENT, self.PART_RELS, self.PART_TYPES):
+                self._zip.writestr(name, data)
+        self._zip.close()
+
+
+class Cache:
+    """On-disk cache of converted documents, keyed by the hashes of everything that goes
+    into them and evicted least recently used first once past `max_size` bytes"""
+
+    def __init__(self, path: Path, max_size: int = 1024 * 1024 * 1024) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self._image_hashes = {}
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def key(
+        self,
+        md_path: Path,
+        style: Style,
+        optimiser: ImageOptimiser | None = None,
+        appendix: bool = True,
+    ) -> str:
+        """Gets key for converting a markdown file with a style, without its images"""
+        md_path = Path(md_path)
+        key = hashlib.sha256()
+        key.update(__version__.encode())
+        key.update(repr(style._key()).encode())
+        key.update(_highlight_key(style))
+        if optimiser is not None:
+            key.update(repr(optimiser._params()).encode())
+        if not appendix:
+            key.update(b"no appendix")
+        key.update(str(md_path.parent.resolve()).encode())
+        with open(md_path, "rb") as file:
+            while chunk := file.read(1 << 16):
+                key.update(chunk)
+        return key.hexdigest()
+
+    def load(self, key: str, docx_path: Path) -> bool:
+        """Copies cached docx to `docx_path` if there's one for `key` whose images are all
+        unchanged, returning if it was"""
+        # Get manifest of images used
+        try:
+            with open(self.path / f"{key}.json", "r") as file:
+                images = json.load(file)["images"]
+        except (OSError, ValueError, KeyError):
+            return False
+        # Check images are still the same
+        for link, digest in images.items():
+            if self._hash_image(Path(link)) != digest:
+                return False
+        # Copy over cached document and mark as recently used
+        cached = self.path / f"{key}.docx"
+        try:
+            shutil.copyfile(cached, docx_path)
+            os.utime(cached)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key: str, doc: "Document", docx_path: Path):
+        """Stores docx at `docx_path` which was saved from `doc` under `key`"""
+        # Hash every image and local file linked to that went into the document, with
+        # files which weren't there hashed as `None` so they're noticed turning up
+        images = {str(link): self._hash_image(link) for link in _linked_files(doc)}
+        # Write manifest and document atomically so parallel conversions don't clash
+        tmp = self.path / f"{key}.{os.getpid()}.tmp"
+        shutil.copyfile(docx_path, tmp)
+        os.replace(tmp, self.path / f"{key}.docx")
+        with open(tmp, "w") as file:
+            json.dump({"images": images}, file)
+        os.replace(tmp, self.path / f"{key}.json")
+        # Keep cache within size
+        self._evict()
+
+    def _hash_image(self, link: Path) -> str | None:
+        """Hashes image content, remembering hashes of files which haven't been touched"""
+        try:
+            stat = link.stat()
+        except OSError:
+            return None
+        memo = (link, stat.st_mtime_ns, stat.st_size)
+        if memo not in self._image_hashes:
+            digest = hashlib.sha256()
+            try:
+                with open(link, "rb") as file:
+                    while chunk := file.read(1 << 16):
+                        digest.update(chunk)
+            except OSError:
+                return None  # a directory where a linked file could be
+            self._image_hashes[memo] = digest.hexdigest()
+        return self._image_hashes[memo]
+
+    def _evict(self):
+        """Removes least recently used documents until the cache is within its size"""
+        # Get cached documents and optimised images, oldest first
+        entries = []
+        for cached in [*self.path.glob("*.docx"), *self.path.glob("images/*")]:
+            try:
+                stat = cached.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, cached))
+        entries.sort()
+        # Remove until small enough
+        size = sum(entry[1] for entry in entries)
+        for _, cached_size, cached in entries:
+            if size <= self.max_size:
+                break
+            cached.unlink(missing_ok=True)
+            if cached.suffix == ".docx":
+                cached.with_suffix(".json").unlink(missing_ok=True)
+            size -= cached_size
+
+
+def update(
+    md_path: Path,
+    docx_path: Path,
+    style: Style = Style.andy(),
+    images: ImageCache | None = None,
+    appendix: bool = True,
+) -> bool:
+    """Converts markdown file at `md_path` into `docx_path`, only re-rendering sections whose
+    markdown has changed since the last update using a manifest kept beside the docx. Falls
+    back to a full rebuild if the docx can't be patched, returning if it was patched"""
+    md_path, docx_path = Path(md_path), Path(docx_path)
+    manifest_path = Path(f"{docx_path}.mdcx.json")
+    if images is None:
+        images = ImageCache()
+
+    # Get key of everything outside the markdown which changes the docx
+    key = hashlib.sha256()
+    key.update(__version__.encode())
+    key.update(repr(style._key()).encode())
+    key.update(_highlight_key(style))
+    if images.optimiser is not None:
+        key.update(repr(images.optimiser._params()).encode())
+    if not appendix:
+        key.update(b"no appendix")
+    key.update(str(md_path.parent.resolve()).encode())
+    key = key.hexdigest()
+
+    # Split markdown into sections, hashing each with whether it's the last one
+    doc = Document.__new__(Document)
+    doc._start(md_path, style, appendix)
+    with open(md_path, "r") as file:
+        lines = _Lines(_rm_toc(file))
+        doc._metadata(lines)
+        sections = list(_sections(lines))
+    hashes = []
+    for ind, section in enumerate(sections):
+        digest = hashlib.sha256("\n".join(section).encode())
+        digest.update(b"last" if ind == len(sections) - 1 else b"")
+        hashes.append(digest.hexdigest())
+
+    # Get previous sections by hash if the docx is still as they were written
+    previous = {}
+    try:
+        with open(manifest_path, "r") as file:
+            manifest = json.load(file)
+        with zipfile.ZipFile(docx_path) as zf:
+            crc = zf.getinfo(_Writer.PART_DOCUMENT).CRC
+        if manifest["key"] == key and manifest["crc"] == crc:
+            for entry in manifest["sections"]:
+                previous.setdefault(entry["hash"], []).append(entry)
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        pass
+
+    # Plan out which sections get copied and which get parsed again, rebuilding everything
+    # if figure numbering has shifted under a section being copied
+    plan = _update_plan(doc, sections, hashes, previous)
+    if plan is None:
+        doc.elements = []
+        doc.ctx = Context(md_path.parent)
+        doc.ctx.appendix.enabled = appendix
+        doc.anchors, doc._slugs, doc._bookmarks = {}, {}, set()
+        plan = _update_plan(doc, sections, hashes, {})
+    appendix = doc._add_appendix()
+    doc._check_links(md_path)
+    images.prefetch(
+        element.link for element in doc.elements if isinstance(element, Image)
+    )
+
+    # Leave the last heading as the current one like after a full parse
+    if len(sections) > 1:
+        doc.ctx.heading = Heading._md(sections[-1][0].lstrip())
+
+    # Write docx, copying unchanged sections out of the previous one
+    patched = any(isinstance(item, dict) for item in plan)
+    tmp = docx_path.with_name(f"{docx_path.name}.{os.getpid()}.tmp")
+    entries = []
+    with zipfile.ZipFile(docx_path) if patched else nullcontext() as base:
+        old = base.read(_Writer.PART_DOCUMENT) if patched else None
+        with _Writer(tmp, _Template.of(style), images, base) as writer:
+            doc._xml_title(writer)
+            for item in plan:
+                start = writer.mark()
+                if isinstance(item, dict):
+                    writer.copy(old[item["start"] : item["end"]])
+                    entry = item
+                else:
+                    elements, entry = item
+                    for element in elements:
+                        element._xml(writer)
+                entry["start"], entry["end"] = start, writer.mark()
+                entries.append(entry)
+            for element in appendix:
+                element._xml(writer)
+    os.replace(tmp, docx_path)
+
+    # Write manifest for the next update
+    with zipfile.ZipFile(docx_path) as zf:
+        crc = zf.getinfo(_Writer.PART_DOCUMENT).CRC
+    with open(tmp, "w") as file:
+        json.dump({"key": key, "crc": crc, "sections": entries}, file)
+    os.replace(tmp, manifest_path)
+    return patched
+
+
+def _update_plan(
+    doc: Document, sections: list, hashes: list, previous: dict
+) -> list | None:
+    """Plans an update by parsing sections which changed into `doc` and picking manifest
+    entries of those which can be copied, or `None` if figure numbering, the slugs of
+    headings or local files in the appendix have shifted. Sections with a table of
+    contents are always parsed again, as it lists headings from every other section, as
+    are those linking to local files which weren't there before but are now"""
+    plan = []
+    for ind, (section, digest) in enumerate(zip(sections, hashes)):
+        # Copy previous section if it, its images and the local files it links to are
+        # unchanged
+        entry = previous[digest].pop(0) if previous.get(digest) else None
+        if (
+            entry is not None
+            and "missing" in entry
+            and not entry["toc"]
+            and all(
+                _file_key(Path(link)) == key for link, key in entry["images"].items()
+            )
+            and not any(os.path.isfile(path) for path in entry["missing"])
+        ):
+            if entry["figures"] and entry["figure"] != doc.ctx.figures:
+                return None
+            # Index its headings, which have to be bookmarked the same as before
+            for text, level, slug in entry["headings"]:
+                heading = Heading(text, level)
+                doc._add_anchor(heading)
+                if heading.slug != slug:
+                    return None
+            doc.ctx.links.extend(entry["links"])
+            # Link to local files in the same order, so they're numbered the same
+            for link in entry["files"]:
+                if doc.ctx.appendix_link(link) is None:
+                    return None
+            doc.ctx.appendix.missing.extend(Path(path) for path in entry["missing"])
+            plan.append(dict(entry, figure=doc.ctx.figures))
+            doc.ctx.figures += entry["figures"]
+            continue
+
+        # Parse section otherwise, looking ahead at the next section's heading
+        after = sections[ind + 1][0] if ind + 1 < len(sections) else None
+        start, figure = len(doc.elements), doc.ctx.figures
+        links, files = len(doc.ctx.links), len(doc.ctx.appendix.links)
+        missing = len(doc.ctx.appendix.missing)
+        doc._parse_lines(_Lines(section, after))
+        elements = doc.elements[start:]
+        entry = {
+            "hash": digest,
+            "figure": figure,
+            "figures": doc.ctx.figures - figure,
+            "headings": [
+                [element.text, element.level, element.slug]
+                for element in elements
+                if isinstance(element, Heading)
+            ],
+            "links": doc.ctx.links[links:],
+            "files": doc.ctx.appendix.links[files:],
+            "missing": [str(path) for path in doc.ctx.appendix.missing[missing:]],
+            "toc": any(isinstance(element, Toc) for element in elements),
+            "images": {
+                str(element.link): _file_key(element.link)
+                for element in elements
+                if isinstance(element, Image)
+            },
+        }
+        plan.append((elements, entry))
+    return plan
+
+
+def _saved_size(path: Path) -> int:
+    """Gets size of a saved document, whether it went to a file or a stream"""
+    if isinstance(path, (str, Path)):
+        return os.path.getsize(path)
+    return path.tell()
+
+
+def _file_key(path: Path) -> list | None:
+    """Gets modified time and size of a file which change if it does, or `None` if it's gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _linked_files(doc: "Document") -> list[Path]:
+    """Gets every image and local file in the appendix which went into a document, and
+    local files it linked to which weren't there"""
+    files = [element.link for element in doc.elements if isinstance(element, Image)]
+    files.extend(doc.ctx.appendix.files)
+    files.extend(doc.ctx.appendix.missing)
+    return files
+
+
+def _highlight_key(style: Style) -> bytes:
+    """Gets key of the pygments version colouring code with a style's theme, as colours
+    can change between versions"""
+    if style.code_theme is None:
+        return b""
+    try:
+        from pygments import __version__ as version
+    except ImportError:
+        version = None
+    return f"pygments {version}".encode()
+
+
+def _style_title_border(style_title):
+    """Removes border style on title which is set by python-docx by default.
+    This is a hack because there's no programmatic way to do this as of writing"""
+    el = style_title._element
+    el.remove(el.xpath("w:pPr")[0])
+
+
+def _level_info(line: str) -> tuple:
+    """Figures out level information and returns it and the line without spacing"""
+    stripped = line.lstrip()
+    num = len(line) - len(stripped)
+    level = int(num / 2)
+    return (level, stripped)
+
+
+class AsyncConverter:
+    """Converts documents from inside of asyncio without blocking the event loop, running
+    at most `max_workers` conversions at once in a thread pool with images shared between
+    them; conversions still waiting for a worker or part way through can be cancelled.
+    Linked local files are only shown in an appendix if `appendix` is on, as markdown
+    converted from inside of a service could come from anyone"""
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        images: ImageCache | None = None,
+        appendix: bool = False,
+    ) -> None:
+        self.max_workers = max_workers
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.images = images if images is not None else ImageCache()
+        self.appendix = appendix
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="mdcx")
+
+    async def convert(
+        self,
+        md: str,
+        path: Path,
+        style: Style = Style.andy(),
+        out: Path | None = None,
+        streaming: bool = False,
+    ) -> bytes | None:
+        """Converts markdown string `md` as if read from the markdown file at `path` into a
+        docx, which is written to `out` if provided or returned as bytes otherwise"""
+        import asyncio
+
+        cancelled = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._pool, self._convert, md, Path(path), style, out, streaming, cancelled
+        )
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Stop the conversion at the next line or element if it's already running
+            cancelled.set()
+            raise
+
+    def close(self):
+        """Shuts down worker threads, waiting for running conversions to finish"""
+        self._pool.shutdown()
+
+    def _convert(
+        self,
+        md: str,
+        path: Path,
+        style: Style,
+        out: Path | None,
+        streaming: bool,
+        cancelled: threading.Event,
+    ) -> bytes | None:
+        # Parse and save, checking for cancellation along the way
+        lines = _checked(md.splitlines(), cancelled)
+        doc = Document.from_stream(lines, path, style, appendix=self.appendix)
+        buf = BytesIO() if out is None else out
+        doc._save(buf, streaming, self.images, _checked(doc.elements, cancelled))
+        return buf.getvalue() if out is None else None
+
+
+_async_converter = None
+
+
+async def convert_async(
+    md: str,
+    path: Path,
+    style: Style = Style.andy(),
+    out: Path | None = None,
+    streaming: bool = False,
+) -> bytes | None:
+    """Converts markdown string `md` from inside of asyncio using a shared converter, see
+    `AsyncConverter.convert` for more info"""
+    global _async_converter
+    if _async_converter is None:
+        _async_converter = AsyncConverter()
+    return await _async_converter.convert(md, path, style, out, streaming)
+
+
+def _err_exit(msg: str):
+    """Prints error message to console and exits program, used for command-line"""
+    print(f"{CLI_HELP}\n\nError: {msg}", file=sys.stderr)
+    sys.exit(1)
+
+
+def _rm_toc(lines: Iterable[str]) -> Iterable[str]:
+    """Removes table of contents sections from markdown lines, yielding the lines kept and
+    a `[TOC]` marker with the section's title in place of each, for a real one to go"""
+    # Parse through
+    in_toc = False
+    in_code = False
+    removed_toc = False
+    for line in lines:
+        clean = line.lstrip()
+        # Keep codeblocks as they are, so their lines never look like titles
+        if in_code or (clean.startswith("```") and not in_toc):
+            in_code = clean.rstrip() != "```" if in_code else True
+            yield line
+        # Title, so either start/end toc removal
+        elif clean.startswith("#") and not removed_toc:
+            # Stop removing toc
+            if in_toc:
+                in_toc = False
+                yield line
+                continue
+            # Start removing toc
+            title = clean.lstrip("#").strip()
+            if title.lower() in ["table of contents", "contents"]:
+                in_toc = True
+                yield f"[TOC] {title}"
+            else:
+                yield line
+        # Add like normal
+        elif not in_toc:
+            yield line
+
+
+def _checked(items: Iterable, cancelled: threading.Event) -> Iterable:
+    """Yields items until `cancelled` is set, used to stop conversions part way through"""
+    for item in items:
+        if cancelled.is_set():
+            import asyncio
+
+            raise asyncio.CancelledError()
+        yield item
+
+
+def _sections(lines: Iterable[str]) -> Iterable[list]:
+    """Splits cleaned up markdown lines into sections starting at each heading outside of
+    codeblocks, the first being everything before the first heading"""
+    section = []
+    for block in scan(lines):
+        if block.kind == BLOCK_HEADING:
+            yield section
+            section = []
+        section.extend(block.lines)
+    yield section
+
+
+def _chunks(lines: Iterable[str], size: int) -> Iterable[tuple]:
+    """Splits cleaned up markdown lines into chunks of at least `size` lines which end
+    before a heading outside of codeblocks, yielding each with the line after it"""
+    chunk = []
+    in_code = False
+    for line in lines:
+        clean = line.lstrip()
+        if in_code:
+            in_code = clean != "```"
+        elif clean.startswith("```"):
+            in_code = True
+        elif clean.startswith("#") and len(chunk) >= size:
+            yield (chunk, line)
+            chunk = []
+        chunk.append(line)
+    yield (chunk, None)
+
+
+def _front_matter(lines: "_Lines") -> tuple:
+    """Reads front matter between `---` lines at the start, returning its lines and if it
+    was closed; unclosed front matter is left to be read again as normal lines"""
+    if lines.peek() != "---":
+        return ([], False)
+    metadata = [next(lines)]
+    closed = False
+    for line in lines:
+        metadata.append(line)
+        if line == "---":
+            closed = True
+            break
+    if not closed:
+        lines.unread(metadata)
+    lines.current = None
+    return (metadata, closed)
+
+
+class _Lines:
+    """Reader over markdown lines which cleans them up as they're read, keeping only the
+    previous line and lines looked ahead at so the whole markdown is never in memory"""
+
+    def __init__(self, lines: Iterable[str], after: str | None = None) -> None:
+        self._lines = iter(lines)
+        self._ahead = deque()
+        self._after = after
+        self.prev = None
+        self.current = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self._ahead.popleft() if self._ahead else next(self._lines).rstrip()
+        self.prev = self.current
+        self.current = line
+        return line
+
+    def peek(self) -> str | None:
+        """Gets the next line without moving onto it, or the line `after` these at the end"""
+        if not self._ahead:
+            try:
+                self._ahead.append(next(self._lines).rstrip())
+            except StopIteration:
+                return self._after
+        return self._ahead[0]
+
+    def unread(self, lines: list):
+        """Puts lines which have already been read back to be read again"""
+        self._ahead.extendleft(reversed(lines))
+
+
+def _add_link(
+    paragraph: docx.text.paragraph.Paragraph, link: str, text: str, external: bool
+):
+    """Places an internal or external link within a paragraph object"""
+    return _Embeds.of(paragraph.part).link(paragraph, link, text, external)
+
+
+def _slug(text: str) -> str:
+    """Gets slug of heading text which links point to it with, the way GitHub makes them"""
+    return _SLUG_STRIP.sub("", text.lower()).replace(" ", "-")
+
+
+def _warn_links(links: Iterable[str], where: str):
+    """Warns once about every distinct link in `where` which matches no heading, listing
+    the first few of them"""
+    links = list(dict.fromkeys(links))
+    if not links:
+        return
+    listed = ", ".join(f"'{link}'" for link in links[:10])
+    if len(links) > 10:
+        listed += f" and {len(links) - 10} more"
+    warnings.warn(f"Links in {where} match no heading: {listed}")
+
+
+def _bookmark_name(anchor: str) -> str:
+    """Gets name of the bookmark an anchor points to, which Word cuts off at 40 characters,
+    so longer anchors are shortened and told apart by a hash of the whole anchor"""
+    if len(anchor) <= 40:
+        return anchor
+    return f"{anchor[:31]}_{zlib.crc32(anchor.encode()):08x}"
+
+
+def _appendix_anchor(path: Path) -> str:
+    """Gets bookmark of the appendix entry for a file from its resolved path"""
+    return f"appendix_{hashlib.sha1(str(path).encode()).hexdigest()[:12]}"
+
+
+def _appendix_read(path: Path, max_bytes: int) -> tuple:
+    """Reads a local file for the appendix, getting its lines or `None` if it's binary,
+    with how many bytes of it are shown and its whole size. Files over `max_bytes` are cut
+    off at the last full line within it, and terminal colours and other control characters
+    which xml can't hold are left out"""
+    with open(path, "rb") as file:
+        data = file.read(max_bytes)
+        size = os.fstat(file.fileno()).st_size
+    if b"\0" in data:
+        return (None, 0, size)
+    if len(data) < size and b"\n" in data:
+        data = data[: data.rindex(b"\n") + 1]
+    text = _XML_INVALID.sub("", data.decode("utf-8", "replace"))
+    return (text.splitlines(), len(data), size)
+
+
+def _table_cells(line: str) -> list[str]:
+    """Splits table row into its cells' text, without the pipes around the edges"""
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip() for cell in _TABLE_PIPE.split(line)]
+
+
+def _text_width(docx_doc: docx.Document) -> int:
+    """Gets width of the page between its margins in twips"""
+    section = docx_doc.sections[0]
+    return (
+        section.page_width.twips
+        - section.left_margin.twips
+        - section.right_margin.twips
+    )
+
+
+def _picture_size(px_width: int, px_height: int) -> tuple:
+    """Gets `(width, height)` to show a picture at so it won't fall off the page, with one
+    left as `None` so the aspect ratio is kept"""
+    from docx.shared import Cm
+
+    if px_height > px_width:
+        return (None, Cm(10))
+    return (Cm(12), None)
+
+
+def _image_named(blob: bytes, filename: str) -> docx.image.image.Image:
+    """Reads image from a blob, keeping a filename for it unlike python-docx's `from_blob`"""
+    import docx.image.image
+
+    return docx.image.image.Image._from_stream(BytesIO(blob), blob, filename)
+
+
+def _xml_run(
+    text: str,
+    bold: bool = False,
+    italic: bool = False,
+    underline: bool = False,
+    strikethrough: bool = False,
+    color: str | None = None,
+) -> str:
+    """Creates run xml with styling, matching what python-docx generates"""
+    props = ""
+    if bold:
+        props += "<w:b/>"
+    if italic:
+        props += "<w:i/>"
+    if strikethrough:
+        props += "<w:strike/>"
+    if color is not None:
+        props += f'<w:color w:val="{color}"/>'
+    if underline:
+        props += '<w:u w:val="single"/>'
+    if props:
+        props = f"<w:rPr>{props}</w:rPr>"
+    if not props and not text:
+        return "<w:r/>"
+    return f"<w:r>{props}{_xml_text(text)}</w:r>"
+
+
+def _xml_text(text: str) -> str:
+    """Creates run content xml from text, with tabs and newlines as their own elements"""
+    xml = []
+    for part in _XML_RUN_SPECIAL.split(text):
+        if part == "\t":
+            xml.append("<w:tab/>")
+        elif part == "\r" or part == "\n":
+            xml.append("<w:br/>")
+        elif part:
+            space = ' xml:space="preserve"' if len(part.strip()) < len(part) else ""
+            xml.append(f"<w:t{space}>{_xml_escape(part)}</w:t>")
+    return "".join(xml)
+
+
+def _xml_escape(text: str) -> str:
+    """Escapes text to be placed inside of xml elements"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _xml_attr(value: str) -> str:
+    """Escapes a value to be placed inside of a double-quoted xml attribute"""
+    value = _xml_escape(value)
+    for char, entity in _XML_ATTR_ENTITIES.items():
+        value = value.replace(char, entity)
+    return value
+
+
+def _xml_unattr(value: str) -> str:
+    """Unescapes a value taken out of an xml attribute written by `_xml_attr`"""
+    for char, entity in _XML_ATTR_ENTITIES.items():
+        value = value.replace(entity, char)
+    return value.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def _is_bib(text: str) -> bool:
+    """Checks if provided heading text is referencing a bibliography"""
+    return text.lower() in ["bibliography", "references"]
+
+
+def _run_ib(ctx: Context, stars: int):
+    """Run parsing for italics and bold"""
 
     # Italics for non-even
     if stars % 2 == 1:
@@ -771,38 +3318,789 @@ def _run_ib(ctx: Context, line: str) -> int:
     if stars > 1:
         ctx.flip_bold()
 
-    # Add star count to index
-    return stars
 
+def _inline_tokens(line: str):
+    """Tokenises inline markdown in a single pass, yielding `(kind, value)` pairs.
 
-def _run_cheeky(ctx: Context, line: str) -> tuple:
-    """Run parsing for cheeky links (the <> links)"""
+    Each character is looked at a bounded number of times; cheeky links and links
+    which can't close are remembered so later `<`/`[` don't rescan the line"""
 
     # Metadata
-    link = ""
-    flipflop = False
-
-    # Go through each character
-    for c in line[1:]:
-        # Flipflop
-        if flipflop:
-            flipflop = False
-            link += c
-        # Backslash for flipflop
-        elif c == "\\":
-            flipflop = True
-        # End of link
-        elif c == ">":
-            break
-        # Character in link
+    ind = 0
+    text_start = 0
+    cheeky_closes = True
+    link_closes = True
+
+    # Go through each special character
+    while match := _INLINE_SPECIAL.search(line, ind):
+        start = match.start()
+        char = line[start]
+        ind = start + 1
+        # Backslash escapes the next character
+        if char == "\\":
+            if ind == len(line):
+                break
+            if start > text_start:
+                yield (_TOKEN_TEXT, line[text_start:start])
+            yield (_TOKEN_TEXT, line[ind])
+            ind += 1
+            text_start = ind
+            continue
+        # Bold/italics
+        if char == "*":
+            end = _INLINE_STARS.match(line, start).end()
+            token = (_TOKEN_STARS, end - start)
+        # Cheeky link
+        elif char == "<":
+            cheeky = _INLINE_CHEEKY.match(line, start) if cheeky_closes else None
+            if cheeky is None:
+                cheeky_closes = False
+                continue
+            end = cheeky.end()
+            token = (_TOKEN_CHEEKY, _INLINE_ESCAPE.sub(r"\1", cheeky.group(1)))
+        # Link
+        else:
+            mid = line.find("](", start + 2) if link_closes else -1
+            close = line.find(")", mid + 2) if mid != -1 else -1
+            if close == -1:
+                link_closes = False
+                continue
+            end = close + 1
+            token = (_TOKEN_LINK, (line[ind:mid], line[mid + 2 : close].strip()))
+        # Flush text before the token and skip over it
+        if start > text_start:
+            yield (_TOKEN_TEXT, line[text_start:start])
+        yield token
+        ind = end
+        text_start = end
+
+    # Leftover text
+    if text_start < len(line):
+        yield (_TOKEN_TEXT, line[text_start:])
+
+
+_batch_images = {}
+
+
+def _convert(
+    md_path: Path,
+    docx_path: Path,
+    style: Style,
+    streaming: bool,
+    cache: Cache | None = None,
+    optimiser: ImageOptimiser | None = None,
+    incremental: bool = False,
+    appendix: bool = True,
+) -> float:
+    """Converts a markdown file into a docx file, returning the seconds it took"""
+    start = time.perf_counter()
+    # Share images with this process's other conversions optimising them the same way
+    images_key = None if optimiser is None else optimiser._params()
+    images = _batch_images.get(images_key)
+    if images is None:
+        images = _batch_images[images_key] = ImageCache(optimiser=optimiser)
+    # Patch previous docx if wanted
+    if incremental:
+        update(md_path, docx_path, style, images, appendix)
+        return time.perf_counter() - start
+    # Reuse cached conversion if nothing's changed
+    if cache is not None:
+        key = cache.key(md_path, style, optimiser, appendix)
+        if cache.load(key, docx_path):
+            return time.perf_counter() - start
+    # Convert
+    with open(md_path, "r") as file:
+        doc = Document.from_stream(file, md_path, style, appendix=appendix)
+    doc.save(docx_path, streaming, images)
+    if cache is not None:
+        cache.store(key, doc, docx_path)
+    return time.perf_counter() - start
+
+
+def _cli_cache(options: list[str]) -> Cache | None:
+    """Gets cache for the command-line if it's been opted into and not opted out of"""
+    if "--no-cache" in options:
+        return None
+    if "--cache" not in options and "MDCX_CACHE" not in os.environ:
+        return None
+    default = Path.home() / ".cache" / "mdcx"
+    return Cache(Path(os.environ.get("MDCX_CACHE", default)))
+
+
+def _cli_jobs(args: list[str], default: int | None) -> tuple:
+    """Gets processes to use from `--jobs` for the command-line, or `default` if it's not
+    given, with the arguments left after taking it out"""
+    if "--jobs" not in args:
+        return (default, args)
+    ind = args.index("--jobs")
+    try:
+        jobs = int(args[ind + 1])
+        if jobs < 1:
+            raise ValueError()
+    except (IndexError, ValueError):
+        _err_exit("Please provide a positive number of --jobs")
+    return (jobs, args[:ind] + args[ind + 2 :])
+
+
+def _cli_optimiser(options: list[str], cache: Cache | None) -> ImageOptimiser | None:
+    """Gets image optimiser for the command-line if it's wanted, using the cache if there's one"""
+    if "--optimise" not in options:
+        return None
+    return ImageOptimiser(cache=cache.path / "images" if cache is not None else None)
+
+
+def _batch_paths(args: list[str]) -> list[Path]:
+    """Expands batch arguments of files, globs and directories into markdown paths"""
+    paths = []
+    for arg in args:
+        if Path(arg).is_dir():
+            paths.extend(sorted(Path(arg).rglob("*.md")))
+        elif glob.has_magic(arg):
+            paths.extend(
+                Path(match) for match in sorted(glob.glob(arg, recursive=True))
+            )
+        else:
+            paths.append(Path(arg))
+    return paths
+
+
+def _batch(
+    args: list[str],
+    style: Style,
+    streaming: bool,
+    cache: Cache | None,
+    optimiser: ImageOptimiser | None,
+    incremental: bool,
+    appendix: bool,
+):
+    """Converts many markdown files in parallel, reporting on each and summarising at the end"""
+    # Get jobs setting
+    jobs, args = _cli_jobs(args, os.cpu_count())
+
+    # Get markdown paths
+    md_paths = _batch_paths([arg for arg in args if not arg.startswith("--")])
+    if len(md_paths) == 0:
+        _err_exit("Please provide [in...] files, globs or directories for batch")
+
+    # Convert each file in a process pool
+    start = time.perf_counter()
+    took = 0.0
+    failed = 0
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {}
+        for md_path in md_paths:
+            docx_path = md_path.with_suffix(".docx")
+            future = pool.submit(
+                _convert,
+                md_path,
+                docx_path,
+                style,
+                streaming,
+                cache,
+                optimiser,
+                incremental,
+                appendix,
+            )
+            futures[future] = (md_path, docx_path)
+        for future in as_completed(futures):
+            md_path, docx_path = futures[future]
+            try:
+                secs = future.result()
+                took += secs
+                print(f"ok    {md_path} -> {docx_path} ({secs:.2f}s)")
+            except Exception as e:
+                failed += 1
+                print(f"fail  {md_path} ({e})", file=sys.stderr)
+
+    # Summarise
+    wall = time.perf_counter() - start
+    print(
+        f"\nConverted {len(md_paths) - failed}/{len(md_paths)} files in {wall:.2f}s "
+        f"({took:.2f}s converting across {jobs} jobs)"
+    )
+    if failed:
+        sys.exit(1)
+
+
+def _book(
+    args: list[str], style: Style, streaming: bool, profiled: bool, appendix: bool
+):
+    """Converts a book of chapters listed in a manifest into one docx"""
+    # Get jobs setting
+    jobs, args = _cli_jobs(args, None)
+
+    # Get manifest and docx paths
+    paths = [arg for arg in args if not arg.startswith("--")]
+    if len(paths) == 0:
+        _err_exit("Please provide [manifest] for book")
+    manifest_path = Path(paths[0])
+    if not manifest_path.exists():
+        _err_exit(f"Manifest file '{paths[0]}' doesn't exist")
+    docx_path = get_docx_path(paths, manifest_path)
+
+    # Assemble and save book
+    profile = Profile() if profiled else nullcontext()
+    with profile:
+        book = Book.from_manifest(manifest_path, style, jobs, appendix)
+        book.save(docx_path, streaming)
+    if profiled:
+        print(profile.table(), file=sys.stderr)
+
+
+def _serve_socket(args: list[str]) -> Path:
+    """Gets socket path for the daemon from `--socket`, $MDCX_SOCKET or the default, which
+    is in $XDG_RUNTIME_DIR or else a directory only this user can get into, so other users
+    can't take its place"""
+    if "--socket" in args:
+        ind = args.index("--socket")
+        if ind + 1 >= len(args):
+            _err_exit("Please provide a path for --socket")
+        return Path(args[ind + 1])
+    if "MDCX_SOCKET" in os.environ:
+        return Path(os.environ["MDCX_SOCKET"])
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(os.environ["XDG_RUNTIME_DIR"]) / "mdcx.sock"
+    import stat
+    import tempfile
+
+    # Make private directory, making sure one someone else made isn't used instead
+    directory = Path(tempfile.gettempdir()) / f"mdcx-{os.getuid()}"
+    try:
+        directory.mkdir(mode=0o700, exist_ok=True)
+        info = directory.lstat()
+    except OSError as e:
+        _err_exit(f"Couldn't make socket directory {directory} ({e})")
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        _err_exit(
+            f"Socket directory {directory} isn't private to this user, please provide"
+            " --socket or $MDCX_SOCKET"
+        )
+    return directory / "mdcx.sock"
+
+
+def _serve_warm():
+    """Renders templates of the built-in styles when a daemon worker starts, so the first
+    job each worker is given doesn't have to"""
+    for style in (Style.andy(), Style.foxtrot()):
+        _Template.of(style)
+
+
+def _serve_convert(
+    md_path: Path,
+    docx_path: Path,
+    style: Style,
+    streaming: bool,
+    cache: Cache | None,
+    optimiser: ImageOptimiser | None,
+    incremental: bool,
+    profiled: bool,
+    appendix: bool,
+) -> tuple:
+    """Converts a markdown file for the daemon, returning the seconds it took and the
+    profile table if it was profiled"""
+    profile = Profile() if profiled else nullcontext()
+    with profile:
+        secs = _convert(
+            md_path,
+            docx_path,
+            style,
+            streaming,
+            cache,
+            optimiser,
+            incremental,
+            appendix,
+        )
+    return (secs, profile.table() if profiled else None)
+
+
+class _Daemon:
+    """Conversion daemon accepting jobs from clients over a unix socket, one json line per
+    request and response, which converts them across a pool of warm worker processes and
+    stops after `idle` seconds without any jobs"""
+
+    def __init__(self, path: Path, jobs: int, idle: float) -> None:
+        self.path = path
+        self.jobs = jobs
+        self.idle = idle
+        self._active = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def serve(self):
+        """Serves jobs until stopped by a client or left idle"""
+        import socket
+        from concurrent.futures import ProcessPoolExecutor
+
+        self._claim()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(str(self.path))
+            # Only let this user send jobs, which write files as them
+            os.chmod(self.path, 0o600)
+            server.listen()
+            server.settimeout(0.5)
+            print(f"Serving on {self.path} with {self.jobs} jobs", file=sys.stderr)
+            try:
+                with ProcessPoolExecutor(self.jobs, initializer=_serve_warm) as pool:
+                    # Warm every worker before the first job comes in
+                    for _ in pool.map(time.sleep, [0.1] * self.jobs):
+                        pass
+                    while not self._stopping.is_set() and not self._idled():
+                        try:
+                            conn, _ = server.accept()
+                        except socket.timeout:
+                            continue
+                        conn.settimeout(None)
+                        with self._lock:
+                            self._active += 1
+                        threading.Thread(
+                            target=self._handle, args=(conn, pool), daemon=True
+                        ).start()
+
+                    # Let running jobs finish before the pool is shut down
+                    while self._active:
+                        time.sleep(0.05)
+            finally:
+                self.path.unlink(missing_ok=True)
+
+    def _claim(self):
+        """Removes a stale socket left behind by a daemon which didn't stop cleanly, or
+        exits if there's a live daemon on it"""
+        if not self.path.exists():
+            return
+        import socket
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(self.path))
+            except OSError:
+                self.path.unlink()
+                return
+        _err_exit(f"A daemon is already serving on {self.path}")
+
+    def _idled(self) -> bool:
+        """Checks if there's been no jobs for longer than the idle timeout"""
+        if self.idle <= 0:
+            return False
+        with self._lock:
+            return self._active == 0 and time.monotonic() - self._last > self.idle
+
+    def _handle(self, conn, pool):
+        """Reads a request from a client, runs it and writes the response back"""
+        try:
+            with conn, conn.makefile("rwb") as file:
+                try:
+                    response = self._job(json.loads(file.readline()), pool)
+                except ValueError as e:
+                    response = _serve_error("ProtocolError", f"Invalid request ({e})")
+                file.write(json.dumps(response).encode() + b"\n")
+        except OSError:
+            pass  # client went away before getting its response
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last = time.monotonic()
+
+    def _job(self, request: dict, pool) -> dict:
+        """Runs a request's arguments like the command-line would from its directory"""
+        if not isinstance(request, dict):
+            return _serve_error("ProtocolError", "Request has to be a json object")
+
+        # Stop serving if asked to
+        if request.get("command") == "stop":
+            self._stopping.set()
+            return {"ok": True}
+
+        # Get paths relative to the client
+        args = request.get("args") or []
+        cwd = request.get("cwd", ".")
+        if (
+            not isinstance(args, list)
+            or not all(isinstance(arg, str) for arg in args)
+            or not isinstance(cwd, str)
+        ):
+            return _serve_error(
+                "ProtocolError",
+                "Request's args have to be a list of strings and its cwd a string",
+            )
+        cwd = Path(cwd)
+        if len(args) == 0 or args[0].startswith("--"):
+            return _serve_error("UsageError", "Please provide [in]")
+        md_path = cwd / args[0]
+        if len(args) > 1 and not args[1].startswith("--"):
+            docx_path = cwd / args[1]
         else:
-            link += c
+            docx_path = cwd / (md_path.stem + ".docx")
+        if not md_path.exists():
+            return _serve_error(
+                "FileNotFoundError", f"Markdown file '{args[0]}' doesn't exist", md_path
+            )
+
+        # Convert on a worker
+        options = args[1:]
+        style = Style.foxtrot() if "--foxtrot" in options else Style.andy()
+        cache = _cli_cache(options)
+        try:
+            secs, table = pool.submit(
+                _serve_convert,
+                md_path,
+                docx_path,
+                style,
+                "--streaming" in options,
+                cache,
+                _cli_optimiser(options, cache),
+                "--update" in options,
+                "--profile" in options,
+                "--no-appendix" not in options,
+            ).result()
+        except Exception as e:
+            return _serve_error(type(e).__name__, str(e), md_path)
+        return {"ok": True, "path": str(docx_path), "seconds": secs, "profile": table}
+
+
+def _serve_error(kind: str, msg: str, path: Path | None = None) -> dict:
+    """Makes a structured error response for a daemon client"""
+    error = {"type": kind, "message": msg}
+    if path is not None:
+        error["path"] = str(path)
+    return {"ok": False, "error": error}
+
+
+def _serve(args: list[str]):
+    """Runs the conversion daemon with the command-line's `serve` arguments"""
+    jobs, args = _cli_jobs(args, os.cpu_count())
+    idle = 600.0
+    try:
+        if "--idle" in args:
+            idle = float(args[args.index("--idle") + 1])
+    except (IndexError, ValueError):
+        _err_exit("Please provide a number of seconds to --idle")
+    try:
+        _Daemon(_serve_socket(args), jobs, idle).serve()
+    except KeyboardInterrupt:
+        pass
+
+
+def _client(args: list[str]):
+    """Forwards command-line arguments to a running daemon, exiting like the conversion
+    would have if it ran here"""
+    import socket
 
-    # Construct new run
-    run = Run(ctx, link, link=(link, True))
+    path = _serve_socket(args)
+    if "--socket" in args:
+        ind = args.index("--socket")
+        args = args[:ind] + args[ind + 2 :]
+    if "--stop" in args:
+        request = {"command": "stop"}
+    else:
+        request = {"args": args, "cwd": os.getcwd()}
+
+    # Send request and wait for the response
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(str(path))
+        except OSError:
+            _err_exit(f"No daemon is serving on {path}, start one with `mdcx serve`")
+        with conn.makefile("rwb") as file:
+            file.write(json.dumps(request).encode() + b"\n")
+            file.flush()
+            line = file.readline()
+    if not line:
+        print("Error: Daemon stopped before finishing the job", file=sys.stderr)
+        sys.exit(1)
+    response = json.loads(line)
+
+    # Report on it
+    if not response["ok"]:
+        error = response["error"]
+        print(f"Error: {error['message']} ({error['type']})", file=sys.stderr)
+        sys.exit(1)
+    if response.get("profile"):
+        print(response["profile"], file=sys.stderr)
+
+
+class _Inotify:
+    """Changes to files in watched directories as reported by inotify, which is Linux only"""
+
+    # Files written, moved in or out, made or removed
+    MASK = 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+    OVERFLOW = 0x4000
+    IGNORED = 0x8000
+
+    def __init__(self) -> None:
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "Couldn't start inotify")
+        self._dirs = {}
+        self._watched = set()
+
+    def watch(self, directory: Path):
+        """Watches for files in a directory changing, unless it's already watched"""
+        if directory in self._watched:
+            return
+        import ctypes
+        import errno
+
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            # Nothing to watch if it's gone or can't be read
+            if code in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return
+            raise OSError(code, f"Couldn't watch {directory}")
+        self._dirs[wd] = directory
+        self._watched.add(directory)
+
+    def track(self, path: Path):
+        """Watches for a file changing through the directory it's in"""
+        self.watch(path.parent)
+
+    def wait(self, timeout: float | None) -> set | None:
+        """Waits up to `timeout` seconds, or until something changes if it's `None`, getting
+        paths which changed or `None` if so much changed that inotify lost track"""
+        import select
+        import struct
+
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        # Go over each event, which is a header followed by a padded file name
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, size = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16 : offset + 16 + size].rstrip(b"\0")
+            offset += 16 + size
+            if mask & self.OVERFLOW:
+                return None
+            if mask & self.IGNORED:
+                self._watched.discard(self._dirs.pop(wd, None))
+            elif wd in self._dirs and name:
+                changed.add(self._dirs[wd] / os.fsdecode(name))
+        return changed
+
+
+class _Poller:
+    """Changes to files found by checking their modified times and sizes every `interval`
+    seconds, for where there's no inotify. Directories change as files are added to or
+    removed from them, so they're never listed again unless they have"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._keys = {}
+
+    def watch(self, directory: Path):
+        """Watches for files being added to or removed from a directory"""
+        self.track(directory)
+
+    def track(self, path: Path):
+        """Watches for a file changing"""
+        if path not in self._keys:
+            self._keys[path] = _file_key(path)
+
+    def wait(self, timeout: float | None) -> set:
+        """Waits up to `timeout` seconds, or until something changes if it's `None`, getting
+        paths which changed"""
+        while True:
+            time.sleep(
+                self.interval if timeout is None else min(self.interval, timeout)
+            )
+            changed = set()
+            for path, key in self._keys.items():
+                new = _file_key(path)
+                if new != key:
+                    self._keys[path] = new
+                    changed.add(path)
+            if changed or timeout is not None:
+                return changed
+
+
+class _Watcher:
+    """Watches a directory of markdown files and the images and local files they link to,
+    rebuilding the docx of each markdown file in `outdir` once changes to it settle. Files
+    are converted one by one in this process, so templates and images stay warm"""
+
+    def __init__(
+        self,
+        src: Path,
+        outdir: Path,
+        style: Style,
+        streaming: bool,
+        optimiser: ImageOptimiser | None,
+        appendix: bool,
+        settle: float,
+        changes: _Inotify | _Poller,
+    ) -> None:
+        self.src = src.resolve()
+        self.outdir = outdir.resolve()
+        self.style = style
+        self.streaming = streaming
+        self.appendix = appendix
+        self.settle = settle
+        self.changes = changes
+        self.images = ImageCache(optimiser=optimiser)
+        # Files linked to by each markdown file, and markdown files linking to each file
+        self.linked = {}
+        self.linking = {}
+
+    def run(self):
+        """Builds every markdown file, then rebuilds them as they change until interrupted"""
+        self._rebuild(self._scan(self.src))
+        while True:
+            changed = self.changes.wait(None)
+            # Wait for changes to settle so a burst of saves only rebuilds once
+            while (more := self.changes.wait(self.settle)) != set():
+                changed = None if changed is None or more is None else changed | more
+            self._rebuild(self._affected(changed))
+
+    def _scan(self, directory: Path) -> set:
+        """Watches a directory and every directory in it, getting markdown files in them
+        which aren't tracked yet"""
+        found = set()
+        for root, _, names in os.walk(directory):
+            root = Path(root)
+            self.changes.watch(root)
+            for name in names:
+                path = root / name
+                if path.suffix == ".md" and path not in self.linked:
+                    self.changes.track(path)
+                    found.add(path)
+        return found
+
+    def _affected(self, changed: set | None) -> set:
+        """Gets markdown files to rebuild after paths changed, or every one of them if
+        which paths changed was lost track of"""
+        if changed is None:
+            return set(self.linked) | self._scan(self.src)
+        affected = set()
+        for path in changed:
+            inside = path.is_relative_to(self.src)
+            if path in self.linked or (inside and path.suffix == ".md"):
+                affected.add(path)
+            affected.update(self.linking.get(path, ()))
+            if inside and path.is_dir():
+                affected.update(self._scan(path))
+        return affected
 
-    # Return ind and link
-    return len(link) + 2, run
+    def _rebuild(self, md_paths: set):
+        """Rebuilds the docx of each markdown file, logging how long each took"""
+        start = time.perf_counter()
+        built = 0
+        failed = 0
+        for md_path in sorted(md_paths):
+            # Stop tracking removed files, leaving their docx behind
+            if not md_path.is_file():
+                if md_path in self.linked:
+                    self._link(md_path, set())
+                    del self.linked[md_path]
+                    print(f"gone  {md_path}")
+                continue
+            built += 1
+            docx_path = self.outdir / md_path.relative_to(self.src).with_suffix(".docx")
+            try:
+                secs = self._convert(md_path, docx_path)
+                print(f"ok    {md_path} -> {docx_path} ({secs:.2f}s)")
+            except Exception as e:
+                failed += 1
+                self.linked.setdefault(md_path, set())
+                print(f"fail  {md_path} ({e})", file=sys.stderr)
+        if built:
+            wall = time.perf_counter() - start
+            print(
+                f"{time.strftime('%H:%M:%S')} Rebuilt {built - failed}/{built} files "
+                f"in {wall:.2f}s",
+                flush=True,
+            )
+
+    def _convert(self, md_path: Path, docx_path: Path) -> float:
+        """Converts a markdown file, tracking the files it links to, returning the seconds
+        it took"""
+        start = time.perf_counter()
+        with open(md_path, "r") as file:
+            doc = Document.from_stream(
+                file, md_path, self.style, appendix=self.appendix
+            )
+        docx_path.parent.mkdir(parents=True, exist_ok=True)
+        doc.save(docx_path, self.streaming, self.images)
+        self._link(md_path, {Path(link).resolve() for link in _linked_files(doc)})
+        return time.perf_counter() - start
+
+    def _link(self, md_path: Path, files: set):
+        """Tracks the files a markdown file links to, in place of those it did before"""
+        for path in self.linked.get(md_path, set()) - files:
+            self.linking[path].discard(md_path)
+        for path in files:
+            self.linking.setdefault(path, set()).add(md_path)
+            self.changes.track(path)
+        self.linked[md_path] = files
+
+
+def _watch(
+    args: list[str],
+    style: Style,
+    streaming: bool,
+    optimiser: ImageOptimiser | None,
+    appendix: bool,
+):
+    """Watches a directory with the command-line's `watch` arguments, rebuilding the docx
+    of each markdown file in it as it changes"""
+    # Get settle and poll settings
+    settle = 0.2
+    poll = None
+    try:
+        if "--settle" in args:
+            ind = args.index("--settle")
+            settle = float(args[ind + 1])
+            args = args[:ind] + args[ind + 2 :]
+        if "--poll" in args:
+            ind = args.index("--poll")
+            poll = float(args[ind + 1])
+            args = args[:ind] + args[ind + 2 :]
+        if settle < 0 or (poll is not None and poll <= 0):
+            raise ValueError()
+    except (IndexError, ValueError):
+        _err_exit("Please provide positive seconds to --settle and --poll")
+
+    # Get directory to watch and where docx files go
+    paths = [arg for arg in args if not arg.startswith("--")]
+    if len(paths) == 0 or not Path(paths[0]).is_dir():
+        _err_exit("Please provide a [dir] to watch")
+    src = Path(paths[0])
+    outdir = Path(paths[1]) if len(paths) > 1 else src
+
+    # Use inotify if it's there, checking files every so often if not
+    changes = None
+    if poll is None:
+        try:
+            changes = _Inotify()
+            how = "with inotify"
+        except (OSError, AttributeError):
+            poll = 1.0
+    if changes is None:
+        changes = _Poller(poll)
+        how = f"checking every {poll}s"
+    print(f"Watching {src} {how}", file=sys.stderr)
+    try:
+        _Watcher(
+            src, outdir, style, streaming, optimiser, appendix, settle, changes
+        ).run()
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        _err_exit(f"Couldn't keep watching {src} ({e}), try --poll")
 
 
 def get_docx_path(args: list[str], md_path: Path) -> Path:
@@ -822,25 +4120,76 @@ if __name__ == "__main__":
     # Make sure theres at least an input and output or show help
     if len(args) == 0:
         _err_exit("Please provide [in]")
-    elif "--help" in args[2:]:
+    elif "--help" in args:
         print(CLI_HELP)
         sys.exit(0)
 
-    # Get foxtrot setting
-    foxtrot = "--foxtrot" in args[2:]
+    # Serve conversions or hand them to a daemon that is
+    if args[0] == "serve":
+        _serve(args[1:])
+        sys.exit(0)
+    elif args[0] == "client":
+        _client(args[1:])
+        sys.exit(0)
+
+    # Get foxtrot and streaming settings, which come after paths
+    options = args[1:] if args[0] in ("batch", "book", "watch") else args[2:]
+    foxtrot = "--foxtrot" in options
+    streaming = "--streaming" in options
+    incremental = "--update" in options
+    appendix = "--no-appendix" not in options
+    style = Style.andy() if not foxtrot else Style.foxtrot()
+    cache = _cli_cache(options)
+    optimiser = _cli_optimiser(options, cache)
 
-    # Get markdown from file
-    md = ""
+    # Assemble books from their manifest
+    if args[0] == "book":
+        _book(args[1:], style, streaming, "--profile" in options, appendix)
+        sys.exit(0)
+
+    # Convert many files at once for batches
+    if args[0] == "batch":
+        _batch(args[1:], style, streaming, cache, optimiser, incremental, appendix)
+        sys.exit(0)
+
+    # Rebuild files in a directory as they change
+    if args[0] == "watch":
+        _watch(args[1:], style, streaming, optimiser, appendix)
+        sys.exit(0)
+
+    # Get markdown path from file
     md_path = Path(args[0])
     docx_path = get_docx_path(args, md_path)
     if not md_path.exists():
         raise Exception(f"Markdown file '{args[0]}' doesn't exist")
-    try:
-        with open(md_path, "r") as file:
-            md = file.read()
-    except Exception as e:
-        _err_exit(f"Markdown file '{args[0]}' is invalid ({e})")
 
-    # Create and save document to defined parts
-    style = Style.andy() if not foxtrot else Style.foxtrot()
-    Document(md, md_path, style).save(docx_path)
+    # Patch previous docx if wanted
+    if incremental:
+        update(md_path, docx_path, style, ImageCache(optimiser=optimiser), appendix)
+        sys.exit(0)
+
+    # Reuse cached conversion if nothing's changed
+    if cache is not None:
+        key = cache.key(md_path, style, optimiser, appendix)
+        if cache.load(key, docx_path):
+            sys.exit(0)
+
+    # Get processes to parse across, which is only worth it for huge files
+    jobs, options = _cli_jobs(options, 1)
+
+    # Profile conversion if wanted
+    profile = Profile() if "--profile" in options else nullcontext()
+    with profile:
+        # Stream markdown from file into a document
+        try:
+            with open(md_path, "r") as file:
+                doc = Document.from_stream(file, md_path, style, jobs, appendix)
+        except (OSError, UnicodeDecodeError) as e:
+            _err_exit(f"Markdown file '{args[0]}' is invalid ({e})")
+
+        # Save document to defined parts
+        doc.save(docx_path, streaming, ImageCache(optimiser=optimiser))
+    if isinstance(profile, Profile):
+        print(profile.table(), file=sys.stderr)
+    if cache is not None:
+        cache.store(key, doc, docx_path)
@@ -0,0 +1,63 @@
+"""Tests for bookmarking headings and linking to them"""
+
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+LONG = "A heading which goes on for far longer than Word lets bookmarks be named"
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_bookmarks_are_unique_and_short(tmp_path: Path, streaming: bool):
+    md = "\n\n".join(
+        [
+            "# Contents",
+            f"# {LONG} one",
+            f"# {LONG} two",
+            f"# {LONG} one",
+            "# Short",
+            f"[first](#{LONG.lower().replace(' ', '-')}-one)",
+        ]
+    )
+    doc = Document(md, tmp_path / "doc.md")
+    doc.save(tmp_path / "doc.docx", streaming)
+    with zipfile.ZipFile(tmp_path / "doc.docx") as docx:
+        root = etree.fromstring(docx.read("word/document.xml"))
+
+    starts = root.iter(f"{W}bookmarkStart")
+    names = {start.get(f"{W}name"): start.get(f"{W}id") for start in starts}
+    assert len(names) == 4
+    assert len(set(names.values())) == 4
+    assert all(len(name) <= 40 for name in names)
+    # Links and the table of contents point at bookmarks which are there
+    anchors = [link.get(f"{W}anchor") for link in root.iter(f"{W}hyperlink")]
+    assert len(anchors) == 5
+    assert set(anchors) <= set(names)
+
+
+def test_missing_links_warn_once(tmp_path: Path):
+    md = "\n\n".join(["# Here", "[a](#gone) [b](#gone) [c](#here) [d](#away)"] * 3)
+    with pytest.warns(UserWarning) as record:
+        Document(md, tmp_path / "doc.md")
+    assert len(record) == 1
+    assert "'#gone', '#away'" in str(record[0].message)
+
+
+def test_book_checks_links_across_chapters(tmp_path: Path):
+    from mdcx import Book
+
+    (tmp_path / "ch1.md").write_text("# Intro\n\nSee [setup](#setup) and [x](#typo).")
+    (tmp_path / "ch2.md").write_text("# Setup\n\nBack to [intro](#intro).")
+    book = Book([tmp_path / "ch1.md", tmp_path / "ch2.md"], jobs=1)
+    with pytest.warns(UserWarning) as record:
+        book.document()
+    assert [str(warning.message) for warning in record] == [
+        "Links in chapters of the book match no heading: '#typo'"
+    ]
@@ -0,0 +1,104 @@
+"""Tests for the appendix of local files linked to"""
+
+import asyncio
+import sys
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_control_characters_are_left_out(tmp_path: Path, streaming: bool):
+    (tmp_path / "build.log").write_bytes(
+        b"\x1b[1;31merror\x1b[0m: build failed\x07\nstep\x08 done\n"
+    )
+    doc = Document("See [the log](build.log).", tmp_path / "doc.md")
+    doc.save(tmp_path / "doc.docx", streaming)
+    with zipfile.ZipFile(tmp_path / "doc.docx") as docx:
+        root = etree.fromstring(docx.read("word/document.xml"))
+    text = "".join(root.itertext())
+    assert "error: build failed" in text
+    assert "step done" in text
+
+
+def test_links_which_cant_be_files(tmp_path: Path):
+    long = "a" * 300
+    doc = Document(f"[x]({long}) and [y](nul\0byte.txt)", tmp_path / "doc.md")
+    assert doc.ctx.appendix.files == {}
+    assert [run.link for run in doc.elements[0].runs if run.link] == [
+        long,
+        "nul\0byte.txt",
+    ]
+
+
+def test_links_without_a_directory():
+    from mdcx import Context, Paragraph
+
+    para = Paragraph._md(Context(), "[config](config.yaml)")
+    assert para.runs[0].link == "config.yaml"
+
+
+def test_files_outside_the_directory_arent_shown(tmp_path: Path):
+    (tmp_path / "secret.txt").write_text("hunter2\n")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "notes.txt").write_text("notes\n")
+    md = f"[a](../secret.txt) [b]({tmp_path / 'secret.txt'}) [c](notes.txt)"
+    doc = Document(md, tmp_path / "docs" / "doc.md")
+    assert list(doc.ctx.appendix.files) == [(tmp_path / "docs" / "notes.txt").resolve()]
+
+
+def test_appendix_can_be_turned_off(tmp_path: Path):
+    (tmp_path / "notes.txt").write_text("notes\n")
+    doc = Document("[n](notes.txt)", tmp_path / "doc.md", appendix=False)
+    assert doc.ctx.appendix.files == {}
+    assert doc.elements[0].runs[0].link_external
+
+
+@pytest.mark.parametrize("appendix", [False, True])
+def test_async_appendix_is_opt_in(tmp_path: Path, appendix: bool):
+    from mdcx import AsyncConverter
+
+    (tmp_path / "notes.txt").write_text("hunter2\n")
+    converter = AsyncConverter(appendix=appendix)
+    try:
+        docx = asyncio.run(converter.convert("[n](notes.txt)", tmp_path / "doc.md"))
+    finally:
+        converter.close()
+    with zipfile.ZipFile(BytesIO(docx)) as zf:
+        assert (b"hunter2" in zf.read("word/document.xml")) == appendix
+
+
+def test_cache_misses_once_a_linked_file_turns_up(tmp_path: Path):
+    from mdcx import Cache, Style
+
+    cache = Cache(tmp_path / "cache")
+    md_path, docx_path = tmp_path / "doc.md", tmp_path / "doc.docx"
+    md_path.write_text("See [n](notes.txt).")
+    key = cache.key(md_path, Style.andy())
+    with open(md_path) as file:
+        doc = Document.from_stream(file, md_path)
+    doc.save(docx_path)
+    cache.store(key, doc, docx_path)
+    assert cache.load(key, tmp_path / "hit.docx")
+    (tmp_path / "notes.txt").write_text("notes\n")
+    assert not cache.load(key, tmp_path / "miss.docx")
+
+
+def test_update_parses_sections_again_once_a_linked_file_turns_up(tmp_path: Path):
+    from mdcx import update
+
+    md_path, docx_path = tmp_path / "doc.md", tmp_path / "doc.docx"
+    md_path.write_text("# One\n\nSee [n](notes.txt).\n\n# Two\n\nText\n")
+    update(md_path, docx_path)
+    (tmp_path / "notes.txt").write_text("hunter2\n")
+    assert update(md_path, docx_path)
+    with zipfile.ZipFile(docx_path) as docx:
+        xml = docx.read("word/document.xml")
+    assert b"hunter2" in xml
+    assert b"w:anchor" in xml
@@ -0,0 +1,36 @@
+"""Tests for colouring fenced code with pygments"""
+
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Cache, Document, Style
+
+MD = "```python\ndef hello():\n    return 'world'\n```"
+
+
+def _document_xml(tmp_path: Path, style: Style) -> bytes:
+    Document(MD, tmp_path / "doc.md", style).save(tmp_path / "doc.docx", True)
+    with zipfile.ZipFile(tmp_path / "doc.docx") as docx:
+        return docx.read("word/document.xml")
+
+
+def test_code_is_uncoloured_by_default(tmp_path: Path):
+    assert b"w:color" not in _document_xml(tmp_path, Style.andy())
+
+
+def test_cache_key_follows_pygments(tmp_path: Path, monkeypatch):
+    pygments = pytest.importorskip("pygments")
+    style = Style.andy()
+    style.code_theme = "default"
+    assert b"w:color" in _document_xml(tmp_path, style)
+
+    cache = Cache(tmp_path / "cache")
+    (tmp_path / "doc.md").write_text(MD)
+    key = cache.key(tmp_path / "doc.md", style)
+    assert key != cache.key(tmp_path / "doc.md", Style.andy())
+    monkeypatch.setattr(pygments, "__version__", "0.0")
+    assert key != cache.key(tmp_path / "doc.md", style)
@@ -0,0 +1,32 @@
+"""Tests for parsing huge documents in chunks across processes"""
+
+import os
+import sys
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document
+
+EXAMPLES = Path(__file__).parent.parent / "examples"
+
+
+def test_chunks_save_the_same_as_serially(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+    monkeypatch.setattr(Document, "CHUNK_LINES", 5)
+    monkeypatch.setattr(Document, "MIN_CHUNKS", 2)
+    path = EXAMPLES / "constructs.md"
+    md = path.read_text()
+    for streaming in (False, True):
+        saved = []
+        for jobs in (1, 2):
+            out = BytesIO()
+            Document(md, path, jobs=jobs).save(out, streaming)
+            saved.append(out.getvalue())
+        assert saved[0] == saved[1]
+
+
+def test_single_cpu_parses_serially(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    monkeypatch.setattr(Document, "_parse_chunks", None)
+    Document("# One\n\ntext", EXAMPLES / "doc.md", jobs=4)
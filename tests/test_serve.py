@@ -0,0 +1,27 @@
+"""Tests for the conversion daemon's handling of requests"""
+
+import json
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import _Daemon
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [["x"], "x", {"args": "example.md"}, {"args": [1]}, {"args": ["a.md"], "cwd": 1}],
+)
+def test_malformed_requests_get_protocol_errors(tmp_path: Path, request_):
+    daemon = _Daemon(tmp_path / "mdcx.sock", 1, 0)
+    server, client = socket.socketpair()
+    with client:
+        client.sendall(json.dumps(request_).encode() + b"\n")
+        daemon._active += 1
+        daemon._handle(server, None)
+        response = json.loads(client.makefile("rb").readline())
+    assert response["ok"] is False
+    assert response["error"]["type"] == "ProtocolError"
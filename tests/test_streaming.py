@@ -0,0 +1,49 @@
+"""Tests for the streaming writer matching what python-docx saves"""
+
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from mdcx import Document, ImageCache, ImageOptimiser
+
+
+def _media(path: Path) -> dict:
+    """Gets every media part of a saved docx by its name"""
+    with zipfile.ZipFile(path) as docx:
+        return {
+            name: docx.read(name)
+            for name in docx.namelist()
+            if name.startswith("word/media/")
+        }
+
+
+def test_streaming_embeds_optimised_images(tmp_path: Path):
+    from PIL import Image
+
+    Image.effect_noise((2400, 1600), 64).convert("RGB").save(tmp_path / "big.png")
+    doc = Document("![Noise](big.png)", tmp_path / "doc.md")
+    for streaming in (False, True):
+        optimiser = ImageOptimiser(format="jpeg")
+        docx_path = tmp_path / f"streaming-{streaming}.docx"
+        doc.save(docx_path, streaming, ImageCache(optimiser=optimiser))
+        media = _media(docx_path)
+        assert list(media) == ["word/media/image1.jpg"]
+        assert media["word/media/image1.jpg"].startswith(b"\xff\xd8")
+    assert _media(tmp_path / "streaming-False.docx") == _media(
+        tmp_path / "streaming-True.docx"
+    )
+
+
+def test_failed_save_keeps_old_file(tmp_path: Path):
+    docx_path = tmp_path / "doc.docx"
+    Document("# Before", tmp_path / "doc.md").save(docx_path, True)
+    before = docx_path.read_bytes()
+    (tmp_path / "broken.png").write_bytes(b"not an image")
+    doc = Document("# After\n\n![Broken](broken.png)", tmp_path / "doc.md")
+    with pytest.raises(Exception, match="Failed to add image"):
+        doc.save(docx_path, True)
+    assert docx_path.read_bytes() == before
+    assert [path.name for path in tmp_path.iterdir() if ".tmp" in path.name] == []